@@ -1,473 +1,573 @@
-import streamlit as st
-import pdfplumber
-import pandas as pd
-from docx import Document
-from docx.shared import Pt
-import re
-from io import BytesIO
-from docx.shared import RGBColor
-
-
-def main():
-    st.title("PDF Data Extraction and DOCX Conversion")
-
-    # File upload
-    uploaded_file = st.file_uploader("Upload a PDF file", type="pdf")
-
-    if uploaded_file is not None:
-        with pdfplumber.open(uploaded_file) as pdf:
-            tables = []
-            for page in pdf.pages:
-                extracted_tables = page.extract_tables()
-                tables.extend(extracted_tables)
-
-        # Initialize table-related data variables
-        df1 = None
-        df2 = None
-
-        # Check if any tables exist
-        if tables:
-            # Extract and process the upper table (second table in the PDF) if present
-            if len(tables) > 1:
-                table_data_1 = tables[1]
-                cleaned_columns_1 = []
-                for i, column_name in enumerate(table_data_1[0]):
-                    if column_name is None:
-                        cleaned_columns_1.append(f"Unnamed_{i}")
-                    elif table_data_1[0].count(column_name) > 1:
-                        cleaned_columns_1.append(f"{column_name}_{i}")
-                    else:
-                        cleaned_columns_1.append(column_name)
-
-                df1 = pd.DataFrame(table_data_1[1:], columns=cleaned_columns_1)
-                st.write("Extracted Upper Table:")
-                st.dataframe(df1)
-
-                # Process the upper table
-                selected_columns_1 = df1.iloc[:, [0, 3]]
-                selected_columns_1.columns = ["Domain Scores", "Percentile"]
-                selected_columns_1['Percentile'] = selected_columns_1['Percentile'].apply(clean_percentile)
-                selected_columns_1.dropna(subset=['Percentile'], inplace=True)
-                selected_columns_1['Grade'] = selected_columns_1['Percentile'].apply(grading_system)
-
-                st.write("Processed Data with Grades for Upper Table:")
-                st.dataframe(selected_columns_1)
-
-        # Extract data from specified test tables
-        test_data = extract_vbm_vsm_finger_tests(uploaded_file)
-        if test_data is not None:
-            st.write("Extracted Test Data:")
-            st.dataframe(pd.DataFrame(test_data))
-
-            # Extract and process the lower table containing Domain, Score, and Severity if present
-            lower_table_data = None
-            for i, table in enumerate(tables):
-                # Check each table for the lower table structure based on known headers
-                if len(table) > 0 and len(table[0]) >= 3 and table[0][0] == "Domain" and table[0][1] == "Score" and table[0][2] == "Severity":
-                    lower_table_data = table
-                    break
-
-            if lower_table_data:
-                # Handle rows with extra columns
-                cleaned_lower_table_data = [row[:3] for row in lower_table_data[1:] if len(row) >= 3]
-                df2 = pd.DataFrame(cleaned_lower_table_data, columns=["Domain", "Score", "Severity"])
-
-                st.write("Extracted Lower Table (Domain, Score, Severity):")
-                st.dataframe(df2)
-
-                # Clean and process the lower table
-                df2['Score'] = df2['Score'].apply(clean_score)
-                df2.dropna(subset=['Score'], inplace=True)
-                df2['Grade'] = df2['Severity'].apply(grading_system_2)
-
-                st.write("Processed Data with Grades for Lower Table:")
-                st.dataframe(df2)
-
-        else:
-            st.error("The uploaded PDF does not contain any tables.")
-            return
-
-        # Combine both dataframes if available or process separately
-        if df1 is not None and df2 is not None:
-            combined_df = pd.concat([selected_columns_1, df2], axis=0, ignore_index=True)
-        elif df1 is not None:
-            combined_df = selected_columns_1
-        elif df2 is not None:
-            combined_df = df2
-        else:
-            combined_df = pd.DataFrame()
-            st.error("No table data was extracted.")
-
-        # Extract GAD-7 score
-        gad7_score = extract_gad7_score(uploaded_file)
-        st.write(gad7_score)
-
-        # Extract PHQ-9 score
-        phq9_score = extract_phq9_score(uploaded_file)
-        phq9_interpretation = interpret_phq9_score(phq9_score)
-        st.write(phq9_interpretation)
-
-        # Convert to DOCX and prepare for download
-        if not combined_df.empty or test_data is not None:
-            docx_data = csv_to_docx_with_flagging(combined_df, test_data, gad7_score, phq9_interpretation)
-            st.download_button(
-                label="Download DOCX",
-                data=docx_data,
-                file_name="extracted_data.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            )
-        else:
-            st.error("No data to convert to DOCX.")
-
-def clean_percentile(value):
-    match = re.search(r'\d+', str(value))
-    return int(match.group(0)) if match else None
-
-def grading_system(percentile):
-    if percentile > 74:
-        return "Above Average"
-    elif 25 <= percentile <= 74:
-        return "Average"
-    elif 9 <= percentile <= 24:
-        return "Low Average"
-    elif 2 <= percentile <= 8:
-        return "Low"
-    else:
-        return "Very Low"
-
-def clean_score(value):
-    match = re.search(r'\d+', str(value))
-    return int(match.group(0)) if match else None
-
-def grading_system_2(severity):
-    if severity in ["Mild", "Moderate", "Severe"]:
-        return "FLAG"
-    else:
-        return None
-
-def csv_to_docx_with_flagging(df, test_data, gad7_score, phq9_score):
-    doc = Document()
-
-    # Adding title with adjusted font size
-    title = doc.add_paragraph("CNSVS Metrics with Percentiles, Scores, and Grades")
-    title_run = title.runs[0]
-    title_run.font.size = Pt(16)
-    title_run.bold = True  # Make the text bold
-    title_run.font.color.rgb = RGBColor(0, 0, 0)  # Set font color to black
-
-    # Flag to track when to insert the new heading
-    npq_heading_added = False
-
-    for _, row in df.iterrows():
-        if 'Domain Scores' in row and pd.notna(row['Domain Scores']):
-            text = f"{row['Domain Scores']}: {row['Percentile']}, {row['Grade']}"
-        elif 'Domain' in row and pd.notna(row['Domain']):
-            text = f"{row['Domain']}: {row['Score']}, {row['Severity']}"
-            # Check if the current row is part of the NeuroPsych Questionnaire (NPQ)
-            if row['Domain'] == "Attention" and not npq_heading_added:
-                # Add the new heading for the NPQ
-                heading = doc.add_paragraph()
-                heading_run = heading.add_run("NeuroPsych Questionnaire (NPQ) SF-45")  # Create the run and add the text
-                heading_run.bold = True  # Make the text bold
-                heading_run.font.size = Pt(14)  # Adjust the size if needed
-                heading_run.font.color.rgb = RGBColor(0, 0, 0)  # Set heading color to black
-                npq_heading_added = True
-
-        # Create a new paragraph
-        p = doc.add_paragraph(style='ListBullet')
-
-        # Add " | FLAG" if the grade is "Low Average," "Low," or "Very Low" for both tables
-        if 'Grade' in row and row['Grade'] in ['Low Average', 'Low', 'Very Low']:
-            run = p.add_run(text + " | ")
-            run_bold = p.add_run("FLAG")
-            run_bold.bold = True
-        elif 'Grade' in row and row['Grade'] == "FLAG":
-            run = p.add_run(text + " | ")
-            run_bold = p.add_run("FLAG")
-            run_bold.bold = True
-        else:
-            p.add_run(text)
-
-    # Add extracted test data to the DOCX document
-    if test_data is not None:
-        for test_name, metrics in test_data.items():
-            # Add the test name as a heading
-            test_name_paragraph = doc.add_paragraph(f" {test_name}")
-            test_name_paragraph.runs[0].bold = True  # Make the test name bold
-
-            # Add each metric under the test
-            for metric, value in metrics.items():
-                p = doc.add_paragraph(style='ListBullet')
-                if "FLAG" in value:
-                    value_part, flag_part = value.split(" | ")
-                    run = p.add_run(f"  {metric}: {value_part} | ")
-                    run_flag = p.add_run("FLAG")
-                    run_flag.bold = True
-                else:
-                    p.add_run(f"  {metric}: {value}")
-
-    # Add GAD-7 score to the document if available
-    if gad7_score:
-        gad7_paragraph = doc.add_paragraph(gad7_score)
-        gad7_paragraph.runs[0].bold = True
-
-    # Add PHQ-9 score to the document if available
-    if phq9_score:
-        phq9_paragraph = doc.add_paragraph(phq9_score)
-        phq9_paragraph.runs[0].bold = True
-
-    # Convert DOCX to a BytesIO object for download
-    bio = BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio
-
-
-def extract_vbm_vsm_finger_tests(uploaded_file):
-    test_data = {
-        "Verbal Memory Test (VBM)": {},
-        "Visual Memory Test (VSM)": {},
-        "Finger Tapping Test (FTT)": {},
-        "Symbol Digit Coding (SDC)": {},
-        "Stroop Test (ST)": {},
-        "Shifting Attention Test (SAT)": {},
-        "Continuous Performance Test (CPT)": {},
-        "Perception Of Emotions Test (POET)": {},
-        "Reasoning Test (RT)": {},
-        "Four Part Continuous Performance Test (FPCPT)": {}
-    }
-
-    with pdfplumber.open(uploaded_file) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text()
-
-        # Function to apply flagging
-        def apply_flagging(percentile):
-            percentile = int(percentile)
-            if percentile > 74:
-                return f"{percentile}, Above Average"
-            elif 25 <= percentile <= 74:
-                return f"{percentile}, Average"
-            elif 9 <= percentile <= 24:
-                return f"{percentile}, Low Average | FLAG"
-            elif 2 <= percentile <= 8:
-                return f"{percentile}, Low | FLAG"
-            else:
-                return f"{percentile}, Very Low | FLAG"
-            
-
-        # Extract Verbal Memory Test (VBM) data
-        vbm_pattern = re.compile(r"Verbal Memory Test \(VBM\).*?Correct Hits - Immediate \d+ \d+ (\d+).*?Correct Passes - Immediate \d+ \d+ (\d+).*?Correct Hits - Delay \d+ \d+ (\d+).*?Correct Passes - Delay \d+ \d+ (\d+)", re.DOTALL)
-        vbm_match = vbm_pattern.search(text)
-        if vbm_match:
-            test_data["Verbal Memory Test (VBM)"] = {
-                "Correct Hits - Immediate": apply_flagging(vbm_match.group(1)),
-                "Correct Passes - Immediate": apply_flagging(vbm_match.group(2)),
-                "Correct Hits - Delay": apply_flagging(vbm_match.group(3)),
-                "Correct Passes - Delay": apply_flagging(vbm_match.group(4))
-            }
-
-        # Extract Visual Memory Test (VSM) data
-        vsm_pattern = re.compile(r"Visual Memory Test \(VSM\).*?Correct Hits - Immediate \d+ \d+ (\d+).*?Correct Passes - Immediate \d+ \d+ (\d+).*?Correct Hits - Delay \d+ \d+ (\d+).*?Correct Passes - Delay \d+ \d+ (\d+)", re.DOTALL)
-        vsm_match = vsm_pattern.search(text)
-        if vsm_match:
-            test_data["Visual Memory Test (VSM)"] = {
-                "Correct Hits - Immediate": apply_flagging(vsm_match.group(1)),
-                "Correct Passes - Immediate": apply_flagging(vsm_match.group(2)),
-                "Correct Hits - Delay": apply_flagging(vsm_match.group(3)),
-                "Correct Passes - Delay": apply_flagging(vsm_match.group(4))
-            }
-
-        # Extract Finger Tapping Test (FTT) data
-        ftt_pattern = re.compile(r"Finger Tapping Test \(FTT\).*?Right Taps Average \d+ \d+ (\d+).*?Left Taps Average \d+ \d+ (\d+)", re.DOTALL)
-        ftt_match = ftt_pattern.search(text)
-        if ftt_match:
-            test_data["Finger Tapping Test (FTT)"] = {
-                "Right Taps Average": apply_flagging(ftt_match.group(1)),
-                "Left Taps Average": apply_flagging(ftt_match.group(2))
-            }
-
-        # Extract Symbol Digit Coding (SDC) data
-        sdc_pattern = re.compile(r"Symbol Digit Coding \(SDC\).*?Correct Responses \d+ \d+ (\d+).*?Errors\* \d+ \d+ (\d+)", re.DOTALL)
-        sdc_match = sdc_pattern.search(text)
-        if sdc_match:
-            test_data["Symbol Digit Coding (SDC)"] = {
-                "Correct Responses": apply_flagging(sdc_match.group(1)),
-                "Errors*": apply_flagging(sdc_match.group(2))
-            }
-
-        # Extract Stroop Test (ST) data
-        st_pattern = re.compile(r"Stroop Test \(ST\).*?Simple Reaction Time\* \d+ \d+ (\d+).*?Complex Reaction Time Correct\* \d+ \d+ (\d+).*?Stroop Reaction Time Correct\* \d+ \d+ (\d+).*?Stroop Commission Errors\* \d+ \d+ (\d+)", re.DOTALL)
-        st_match = st_pattern.search(text)
-        if st_match:
-            test_data["Stroop Test (ST)"] = {
-                "Simple Reaction Time*": apply_flagging(st_match.group(1)),
-                "Complex Reaction Time Correct*": apply_flagging(st_match.group(2)),
-                "Stroop Reaction Time Correct*": apply_flagging(st_match.group(3)),
-                "Stroop Commission Errors*": apply_flagging(st_match.group(4))
-            }
-
-        # Extract Shifting Attention Test (SAT) data
-        sat_pattern = re.compile(r"Shifting Attention Test \(SAT\).*?Correct Responses \d+ \d+ (\d+).*?Errors\* \d+ \d+ (\d+).*?Correct Reaction Time\* \d+ \d+ (\d+)", re.DOTALL)
-        sat_match = sat_pattern.search(text)
-        if sat_match:
-            test_data["Shifting Attention Test (SAT)"] = {
-                "Correct Responses": apply_flagging(sat_match.group(1)),
-                "Errors*": apply_flagging(sat_match.group(2)),
-                "Correct Reaction Time*": apply_flagging(sat_match.group(3))
-            }
-
-        # Extract Continuous Performance Test (CPT) data
-        cpt_pattern = re.compile(r"Continuous Performance Test \(CPT\).*?Correct Responses \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Choice Reaction Time Correct\* \d+ \d+ (\d+)", re.DOTALL)
-        cpt_match = cpt_pattern.search(text)
-        if cpt_match:
-            test_data["Continuous Performance Test (CPT)"] = {
-                "Correct Responses": apply_flagging(cpt_match.group(1)),
-                "Omission Errors*": apply_flagging(cpt_match.group(2)),
-                "Commission Errors*": apply_flagging(cpt_match.group(3)),
-                "Choice Reaction Time Correct*": apply_flagging(cpt_match.group(4))
-            }
-
-        # Extract Perception Of Emotions Test (POET) data
-        poet_pattern = re.compile(r"Perception Of Emotions Test \(POET\).*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Positive Emotions.*?Correct Hits \d+ \d+ (\d+).*?Reaction Time\* \d+ \d+ (\d+).*?Negative Emotions.*?Correct Hits \d+ \d+ (\d+).*?Reaction Time\* \d+ \d+ (\d+)", re.DOTALL)
-        poet_match = poet_pattern.search(text)
-        if poet_match:
-            test_data["Perception Of Emotions Test (POET)"] = {
-                "Correct Responses": apply_flagging(poet_match.group(1)),
-                "Average Correct Reaction Time*": apply_flagging(poet_match.group(2)),
-                "Omission Errors*": apply_flagging(poet_match.group(3)),
-                "Commission Errors*": apply_flagging(poet_match.group(4)),
-                "Positive Emotions": [
-                    {"Correct Hits": apply_flagging(poet_match.group(5))},
-                    {"Reaction Time*": apply_flagging(poet_match.group(6))}
-                ],
-                "Negative Emotions": [
-                    {"Correct Hits": apply_flagging(poet_match.group(7))},
-                    {"Reaction Time*": apply_flagging(poet_match.group(8))}
-                ]
-            }
-
-        # Extract Reasoning Test (RT) data
-        rt_pattern = re.compile(r"Reasoning Test \(RT\).*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+)", re.DOTALL)
-        rt_match = rt_pattern.search(text)
-        if rt_match:
-            test_data["Reasoning Test (RT)"] = {
-                "Correct Responses": apply_flagging(rt_match.group(1)),
-                "Average Correct Reaction Time*": apply_flagging(rt_match.group(2)),
-                "Commission Errors*": apply_flagging(rt_match.group(3)),
-                "Omission Errors*": apply_flagging(rt_match.group(4))
-            }
-
-        # Extract Four Part Continuous Performance Test (FPCPT) data
-        fpcpt_pattern = re.compile(r"Four Part Continuous Performance Test \(FPCPT\).*?"
-                        r"Part 1.*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Part 2.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Omission Errors\* \d+ \d+ (\d+).*?"
-                        r"Part 3.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Omission Errors\* \d+ \d+ (\d+).*?"
-                        r"Part 4.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
-                        r"Omission Errors\* \d+ \d+ (\d+)", re.DOTALL)       
-        fpcpt_match = fpcpt_pattern.search(text)
-        if fpcpt_match:
-            test_data = f"""
-    **Four Part Continuous Performance Test (FPCPT)**:
-      • **Part 1**:
-        • Average Correct Reaction Time*: {apply_flagging(fpcpt_match.group(1))}
-      • **Part 2**:
-        • Correct Responses: {apply_flagging(fpcpt_match.group(2))}
-        • Average Correct Reaction Time*: {apply_flagging(fpcpt_match.group(3))}
-        • Incorrect Responses*: {apply_flagging(fpcpt_match.group(4))}
-        • Average Incorrect Reaction Time*: {apply_flagging(fpcpt_match.group(5))}
-        • Omission Errors*: {apply_flagging(fpcpt_match.group(6))}
-      • **Part 3**:
-        • Correct Responses: {apply_flagging(fpcpt_match.group(7))}
-        • Average Correct Reaction Time*: {apply_flagging(fpcpt_match.group(8))}
-        • Incorrect Responses*: {apply_flagging(fpcpt_match.group(9))}
-        • Average Incorrect Reaction Time*: {apply_flagging(fpcpt_match.group(10))}
-        • Omission Errors*: {apply_flagging(fpcpt_match.group(11))}
-      • **Part 4**:
-        • Correct Responses: {apply_flagging(fpcpt_match.group(12))}
-        • Average Correct Reaction Time*: {apply_flagging(fpcpt_match.group(13))}
-        • Incorrect Responses*: {apply_flagging(fpcpt_match.group(14))}
-        • Average Incorrect Reaction Time*: {apply_flagging(fpcpt_match.group(15))}
-        • Omission Errors*: {apply_flagging(fpcpt_match.group(16))}
-    """
-    return test_data
-
-# Function to classify the GAD-7 score based on provided ranges
-def classify_gad7_score(score):
-    score = int(score)
-    if 0 <= score <= 4:
-        return "None-Minimal anxiety"
-    elif 5 <= score <= 9:
-        return "Mild anxiety"
-    elif 10 <= score <= 14:
-        return "Moderate anxiety"
-    elif 15 <= score <= 21:
-        return "Severe anxiety"
-    else:
-        return "Invalid score"
-
-# Function to extract and classify GAD-7 score from a PDF
-def extract_gad7_score(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        full_text = ""
-        for page in pdf.pages:
-            full_text += page.extract_text()
-
-    # Regular expression to extract the GAD-7 score and severity
-    gad7_pattern = r'GAD-7 Anxiety Severity\s+(\d+)\s*\n'
-
-    # Search for the pattern in the full text
-    gad7_match = re.search(gad7_pattern, full_text, re.DOTALL)
-
-    if gad7_match:
-        gad7_score = gad7_match.group(1)
-        calculated_severity = classify_gad7_score(gad7_score)
-        # Format the result to match the required output
-        return f"Generalized Anxiety Disorder (GAD-7) Scale:\n• Total Score: {gad7_score} ({calculated_severity})"
-    else:
-        return "GAD-7 score not found in the document."
-    
-
-# Extract PHQ-9 score and classify it
-def extract_phq9_score(pdf_path):
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text()
-    
-    score_match = re.search(r"PHQ-9 Score (\d+)", text)
-    
-    if score_match:
-        score = int(score_match.group(1))
-        return score
-    else:
-        return None
-
-def interpret_phq9_score(score):
-    if score is None:
-        return "PHQ-9 score not found"
-    elif 1 <= score <= 4:
-        severity = "Minimal depression"
-    elif 5 <= score <= 9:
-        severity = "Mild depression"
-    elif 10 <= score <= 14:
-        severity = "Moderate depression"
-    elif 15 <= score <= 19:
-        severity = "Moderately severe depression"
-    elif 20 <= score <= 27:
-        severity = "Severe depression"
-    else:
-        return "Score out of expected range"
-
-    # Return the output in the desired format
-    return f"Patient Health Questionnaire (PHQ-9):\n• Total Score: {score} ({severity})"
-
-
-if __name__ == "__main__":
-    main()
+import streamlit as st
+import pandas as pd
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from batch import (
+    BatchResult,
+    BatchZip,
+    iter_pdf_inputs,
+    plan_split_pdf,
+    process_guarded_pdf,
+    process_split_report,
+    split_report_name,
+)
+from cohort_store import TABLES, CohortStore
+from export import EXTENSIONS, FORMATS, MIME_TYPES, export_entry
+from guard import prepare_guarded_report, start_runner
+from instrumentation import REGISTRY, PipelineMetrics, stage, start_metrics_server, start_tracing
+from jobs import CANCELLED, CANCELLING, DONE, FAILED, JobQueue, QueueFull
+from pipeline import (
+    combine_tables,
+    extract_report_data,
+    grade_choices,
+    override_grades,
+    phq9_line,
+    process_lower_table,
+    process_upper_table,
+    questionnaires_failed,
+    regrade_entry,
+    render_report_docx,
+    summarize_report,
+)
+from report_cache import ReportCache, content_key
+from warmup import warm_up
+
+# Offered ahead of a section's grades (pipeline.grade_choices); keeps the derived grade
+KEEP_GRADE = "(as graded)"
+
+# Seconds between reruns while a session waits on its background jobs
+POLL_S = 0.5
+
+# Batch ZIPs are read from their temporary files on a download thread
+ZIP_LOCK = threading.Lock()
+
+
+# One cache per server process, shared by every session and rerun
+@st.cache_resource
+def get_report_cache():
+    return ReportCache(
+        max_entries=int(os.environ.get("CNSVS_CACHE_SIZE", "32")),
+        disk_dir=os.environ.get("CNSVS_CACHE_DIR") or None,
+    )
+
+
+# Background job queue shared by every session; each worker starts (and warms)
+# the child process its guarded stages run in as soon as it starts itself
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(
+        max_workers=int(os.environ.get("CNSVS_JOB_WORKERS", "0")) or None,
+        per_user_limit=int(os.environ.get("CNSVS_JOBS_PER_USER", "0")) or None,
+        initializer=start_runner,
+    )
+
+
+# Once per server process: start the job workers and warm this process too, so
+# the first upload does not wait on imports or template parsing
+@st.cache_resource
+def warm_start():
+    get_job_queue().warm()
+    return warm_up()
+
+
+# Jobs are owned by the browser session that submitted them
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+
+# Cohort store shared by every session; None unless CNSVS_COHORT_DB names a SQLite file
+@st.cache_resource
+def get_cohort_store():
+    path = os.environ.get("CNSVS_COHORT_DB")
+    if not path:
+        return None
+    return CohortStore(path)
+
+
+# Start memory tracing and the local Prometheus endpoint once per server process;
+# job workers and their stage children start their own tracing
+@st.cache_resource
+def start_instrumentation():
+    start_tracing()
+    port = os.environ.get("CNSVS_METRICS_PORT")
+    if port:
+        return start_metrics_server(int(port))
+    return None
+
+
+def main():
+    st.title("PDF Data Extraction and DOCX Conversion")
+    start_instrumentation()
+    warm_metrics = warm_start()
+    show_diagnostics = st.sidebar.checkbox("Show diagnostics")
+    if show_diagnostics:
+        job_queue_panel(get_job_queue().stats())
+        st.sidebar.write(f"Server warm-up: {warm_metrics['total_wall_s']:.2f}s")
+
+    mode = st.radio("Mode", ["Single report", "Batch", "Cohort"], horizontal=True)
+    if mode == "Batch":
+        batch_mode()
+        return
+    if mode == "Cohort":
+        cohort_mode()
+        return
+
+    # File upload
+    uploaded_file = st.file_uploader("Upload a PDF file", type="pdf")
+
+    if uploaded_file is not None:
+        # Parse the upload in the background once (or reuse the cached result for identical bytes)
+        cache = get_report_cache()
+        pdf_bytes = uploaded_file.getvalue()
+        metrics = wait_for_report(pdf_bytes, uploaded_file.name, cache)
+        if metrics is None:
+            return
+        cache_key, extracted = extract_report_data(pdf_bytes, cache, metrics)
+        tables = extracted["tables"]
+        edits = extracted.get("edits")
+        for error in extracted.get("errors", []):
+            st.warning(f"Stage {error.stage} {error.kind}: {error.message}. Its results are missing below.")
+        if extracted.get("errors") and st.button("Retry processing"):
+            # Partial results are only in memory; drop them and queue the PDF again
+            cache.discard(cache_key)
+            st.session_state.get("report_jobs", {}).pop(cache_key, None)
+            st.session_state.pop("recorded_upload", None)
+            st.rerun()
+
+        # Extract and process the upper table (second table in the PDF) if present
+        with stage(metrics, "process_tables"):
+            df1, selected_columns_1 = process_upper_table(tables)
+            selected_columns_1 = override_grades(selected_columns_1, "Domain Scores", edits)
+        if df1 is not None:
+            st.write("Extracted Upper Table:")
+            st.dataframe(df1)
+            st.write("Processed Data with Grades for Upper Table:")
+            st.dataframe(selected_columns_1)
+
+        # Extract data from specified test tables
+        test_data = extracted["test_data"]
+        df2 = None
+        if test_data is not None:
+            st.write("Extracted Test Data:")
+            st.dataframe(pd.DataFrame(test_data))
+
+            # Extract and process the lower table containing Domain, Score, and Severity if present
+            with stage(metrics, "process_tables"):
+                raw_df2, df2 = process_lower_table(tables)
+                df2 = override_grades(df2, "NPQ", edits)
+            if raw_df2 is not None:
+                st.write("Extracted Lower Table (Domain, Score, Severity):")
+                st.dataframe(raw_df2)
+                st.write("Processed Data with Grades for Lower Table:")
+                st.dataframe(df2)
+
+        else:
+            st.error("The uploaded PDF does not contain any tables.")
+            return
+
+        # Combine both dataframes if available or process separately
+        combined_df = combine_tables(selected_columns_1, df2)
+        if selected_columns_1 is None and df2 is None:
+            st.error("No table data was extracted.")
+
+        # GAD-7 and PHQ-9 lines, unless their stage failed (warned about above)
+        if not questionnaires_failed(extracted):
+            st.write(extracted["gad7_score"])
+            st.write(phq9_line(extracted))
+
+        # Convert to DOCX and prepare for download
+        if not combined_df.empty or test_data is not None:
+            docx_data = extracted.get("docx")
+            # Rendering again here after the guarded render failed would run
+            # that stage outside its budget
+            failed_stages = {error.stage for error in extracted.get("errors", [])}
+            if docx_data is None and "render_docx" not in failed_stages:
+                # Not rendered yet, or dropped by a re-grade
+                with stage(metrics, "render_docx"):
+                    docx_data = render_report_docx(extracted).getvalue()
+                cache.update(cache_key, docx=docx_data)
+            if docx_data is not None:
+                st.download_button(
+                    label="Download DOCX",
+                    data=docx_data,
+                    file_name="extracted_data.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                )
+            else:
+                st.error("The DOCX could not be rendered.")
+            if not extracted.get("errors"):
+                export_downloads(extracted, uploaded_file.name, cache_key)
+            edit_panel(cache, cache_key, extracted)
+        else:
+            st.error("No data to convert to DOCX.")
+
+        # Record each upload once per session; widget reruns only hit the cache
+        if st.session_state.get("recorded_upload") != cache_key:
+            st.session_state["recorded_upload"] = cache_key
+            store = get_cohort_store()
+            # Partial results stay out; the store never replaces a report it has
+            if store is not None and not extracted.get("errors") and cache_key not in store:
+                with stage(metrics, "cohort_ingest"):
+                    store.ingest(cache_key, summarize_report(extracted), uploaded_file.name)
+            st.session_state["upload_metrics"] = metrics.to_dict()
+            REGISTRY.record(metrics)
+        if show_diagnostics:
+            diagnostics_panel(st.session_state["upload_metrics"])
+
+
+# The extracted values in the other export formats, all from one grading pass
+def export_downloads(entry, name, cache_key):
+    formats = [fmt for fmt in FORMATS if fmt != "docx"]
+    for fmt, data in export_entry(entry, name, cache_key, formats).items():
+        st.download_button(
+            label=f"Download {fmt.upper()}",
+            data=data,
+            file_name=f"extracted_data{EXTENSIONS[fmt]}",
+            mime=MIME_TYPES[fmt],
+            key=f"download_{fmt}",
+        )
+
+
+# Clinician edits: override a result's grade or set notes. Only the grades and
+# the DOCX are rebuilt (pipeline.regrade_entry); the PDF is not read again
+def edit_panel(cache, cache_key, entry):
+    edits = entry.get("edits") or {}
+    grades = {section: dict(items) for section, items in (edits.get("grades") or {}).items()}
+    summary = summarize_report(entry)
+    items = [("Domain Scores", row["domain"]) for row in summary["domain_scores"]]
+    items += [("NPQ", row["domain"]) for row in summary["npq"]]
+    items += [(test_name, metric) for test_name, metrics in entry["subtest_percentiles"].items()
+              for metric, value in metrics.items() if not isinstance(value, list)]
+
+    with st.expander("Edit grades and notes"):
+        item = st.selectbox("Result", items, format_func=lambda item: f"{item[0]}: {item[1]}")
+        choices = [KEEP_GRADE, *grade_choices(item[0] if item is not None else None)]
+        grade = st.selectbox("Grade", choices, format_func=lambda grade: "(no flag)" if grade is None else grade)
+        notes = st.text_area("Notes (one per line)", "\n".join(edits.get("notes") or []))
+        if grades:
+            st.write({section: overrides for section, overrides in grades.items() if overrides})
+        if st.button("Apply edits"):
+            if item is not None:
+                section, label = item
+                if grade == KEEP_GRADE:
+                    grades.get(section, {}).pop(label, None)
+                else:
+                    grades.setdefault(section, {})[label] = grade
+            new_edits = {
+                "grades": {section: overrides for section, overrides in grades.items() if overrides},
+                "notes": [line for line in notes.splitlines() if line.strip()],
+            }
+            new_entry = regrade_entry(entry, new_edits, render_docx=True)
+            cache.set_edits(cache_key, new_edits)
+            cache.put(cache_key, new_entry)
+            store = get_cohort_store()
+            if store is not None and cache_key in store:
+                store.replace_many([(cache_key, summarize_report(new_entry), None)])
+            st.rerun()
+
+
+# Queue the upload as a background job and show its progress. Returns the
+# job's PipelineMetrics once the report is in the cache, with any clinician
+# edits saved for it applied, None until then
+def wait_for_report(pdf_bytes, name, cache):
+    key = content_key(pdf_bytes)
+    if key in cache:
+        return PipelineMetrics(name)
+
+    queue = get_job_queue()
+    report_jobs = st.session_state.setdefault("report_jobs", {})
+    job = queue.get(report_jobs.get(key))
+    if job is None:
+        try:
+            job = queue.submit(session_id(), name, prepare_guarded_report, pdf_bytes, name)
+        except QueueFull:
+            st.error("The server is busy. Please try again in a minute.")
+            return None
+        report_jobs[key] = job.id
+
+    if job.status == DONE:
+        # Collected: the cache holds the entry from here on
+        queue.pop(job.id)
+        del report_jobs[key]
+        _, entry, metrics = job.result
+        edits = cache.edits(key)
+        if edits is not None and entry.get("edits") != edits:
+            # The edited entry has left the cache since this job finished
+            entry = regrade_entry(entry, edits, render_docx=True)
+        cache.put(key, entry)
+        return metrics
+    if job.status in (FAILED, CANCELLED, CANCELLING):
+        if job.status == FAILED:
+            st.error(f"Processing failed: {job.error}")
+        else:
+            st.warning("Processing was cancelled.")
+        if st.button("Process again"):
+            queue.pop(job.id)
+            del report_jobs[key]
+            st.rerun()
+        return None
+
+    position = queue.position(job.id)
+    if position is not None:
+        st.info(f"{name} is queued ({position} in line).")
+    else:
+        st.info(f"Processing {name} ({job.run_s:.0f}s)...")
+    if st.button("Cancel"):
+        queue.cancel(job.id)
+        st.rerun()
+    time.sleep(POLL_S)
+    st.rerun()
+
+
+# Queue depth and recent latencies of the shared job queue
+def job_queue_panel(stats):
+    with st.sidebar.expander("Job queue", expanded=True):
+        st.write(f"{stats['queued']} queued, {stats['running']} of {stats['workers']} workers busy "
+                 f"(up to {stats['per_user_limit']} per session while others wait)")
+        st.write(f"Longest current wait: {stats['oldest_wait_s']:.1f}s")
+        st.dataframe(pd.DataFrame([
+            {"latency": "queue wait", "p50_s": stats["wait_p50_s"], "p95_s": stats["wait_p95_s"]},
+            {"latency": "run", "p50_s": stats["run_p50_s"], "p95_s": stats["run_p95_s"]},
+        ]))
+        if stats["finished"]:
+            st.write(stats["finished"])
+
+
+# Per-stage timings and memory of the current upload, with a JSON export
+def diagnostics_panel(upload_metrics):
+    with st.expander("Diagnostics", expanded=True):
+        rows = [{"stage": name, **stats} for name, stats in upload_metrics["stages"].items()]
+        st.dataframe(pd.DataFrame(rows))
+        st.write(f"Total pipeline time: {upload_metrics['total_wall_s']:.3f}s")
+        if upload_metrics["counters"]:
+            st.write(upload_metrics["counters"])
+        st.download_button(
+            label="Download metrics JSON",
+            data=json.dumps(upload_metrics, indent=2),
+            file_name="metrics.json",
+            mime="application/json"
+        )
+
+
+# Process many PDFs (or ZIPs of them) in a process pool and offer one ZIP of DOCX reports
+def batch_mode():
+    uploaded_files = st.file_uploader(
+        "Upload CNSVS PDFs, or ZIP archives of them",
+        type=["pdf", "zip"],
+        accept_multiple_files=True,
+    )
+    if not uploaded_files:
+        return
+    split = st.checkbox("Each PDF holds several patients' reports")
+    formats = st.multiselect("Formats in the ZIP", FORMATS, default=["docx"], format_func=str.upper)
+
+    if st.button(f"Process {len(uploaded_files)} upload(s)"):
+        if not formats:
+            st.error("Choose at least one format.")
+            return
+        items = list(iter_pdf_inputs((f.name, f.getvalue()) for f in uploaded_files))
+        if not items:
+            st.error("No PDF files were found in the upload.")
+            return
+
+        # One background job per file; the session's limit spreads the workers
+        # fairly between this batch and other users. A multi-patient file is
+        # written to disk and first gets a job that finds its reports
+        # (plan_split_pdf); collect_batch then queues one job per report
+        queue = get_job_queue()
+        batch_dir = tempfile.TemporaryDirectory() if split else None
+        job_ids = []
+        plans = {}
+        try:
+            for number, (name, pdf_bytes) in enumerate(items):
+                if split:
+                    pdf_path = os.path.join(batch_dir.name, f"{number}.pdf")
+                    with open(pdf_path, "wb") as f:
+                        f.write(pdf_bytes)
+                    job = queue.submit(session_id(), name, plan_split_pdf, name, pdf_path)
+                    plans[job.id] = (name, pdf_path)
+                else:
+                    job = queue.submit(session_id(), name, process_guarded_pdf, name, pdf_bytes)
+                job_ids.append(job.id)
+        except QueueFull:
+            for job_id in job_ids:
+                queue.cancel(job_id)
+            if batch_dir is not None:
+                batch_dir.cleanup()
+            st.error("The server is busy. Please try again in a minute.")
+            return
+        # A new batch replaces the last one, finished or not
+        for job_id in st.session_state.pop("batch_jobs", []):
+            queue.cancel(job_id)
+        previous = st.session_state.pop("batch_archive", None)
+        if previous is not None:
+            previous.close().close()
+        previous = st.session_state.pop("batch_zip", None)
+        if previous is not None:
+            previous.close()
+        previous = st.session_state.pop("batch_dir", None)
+        if previous is not None:
+            previous.cleanup()
+        st.session_state["batch_jobs"] = job_ids
+        st.session_state["batch_plans"] = plans
+        st.session_state["batch_todo"] = []
+        st.session_state["batch_dir"] = batch_dir
+        # Written to a temporary file as each job finishes, not held in memory
+        st.session_state["batch_archive"] = BatchZip(tempfile.TemporaryFile(), formats=formats)
+        st.session_state["batch_total"] = len(job_ids)
+
+    if "batch_jobs" in st.session_state:
+        collect_batch(st.session_state["batch_jobs"], st.session_state["batch_archive"])
+
+    if "batch_zip" in st.session_state:
+        failures = st.session_state["batch_failures"]
+        st.write(f"Converted {st.session_state['batch_written']} report(s), {len(failures)} failed.")
+        if failures:
+            st.dataframe(pd.DataFrame(failures, columns=["File", "Error"]))
+        st.download_button(
+            label="Download ZIP",
+            data=zip_reader(st.session_state["batch_zip"]),
+            file_name="cnsvs_reports.zip",
+            mime="application/zip"
+        )
+
+
+# The bytes of a finished batch ZIP, read from its file only when downloaded
+def zip_reader(fileobj):
+    def read():
+        with ZIP_LOCK:
+            fileobj.seek(0)
+            return fileobj.read()
+    return read
+
+
+# Follow a batch's jobs, adding each one's results to the archive (and the
+# cohort store) as soon as it finishes and dropping them from the job queue.
+# A finished plan job is replaced by one job per report it found; those wait
+# in batch_todo while the queue is full
+def collect_batch(job_ids, archive):
+    queue = get_job_queue()
+    store = get_cohort_store()
+    plans = st.session_state["batch_plans"]
+    todo = st.session_state["batch_todo"]
+    waiting = []
+    summaries = []
+    for job_id in job_ids:
+        job = queue.get(job_id)
+        if job is None:
+            continue
+        if not job.finished:
+            waiting.append(job_id)
+            continue
+        queue.pop(job_id)
+        plan = plans.pop(job_id, None)
+        if plan is not None and job.status == DONE:
+            name, pdf_path = plan
+            source_key, ranges = job.result
+            for number, (first, end) in enumerate(ranges, start=1):
+                todo.append((split_report_name(name, number), (name, pdf_path, source_key, number, first, end)))
+            st.session_state["batch_total"] += len(ranges) - 1
+            continue
+        result = job.result if job.status == DONE else BatchResult(job.name, None, job.error or "Cancelled")
+        archive.add(result)
+        if result.data is not None:
+            summaries.append((result.key, result.data, result.name))
+    if store is not None and summaries:
+        store.ingest_many(summaries)
+    try:
+        while todo:
+            name, args = todo[0]
+            waiting.append(queue.submit(session_id(), name, process_split_report, *args).id)
+            todo.pop(0)
+    except QueueFull:
+        pass
+    st.session_state["batch_jobs"] = waiting
+
+    if waiting or todo:
+        total = st.session_state["batch_total"]
+        finished = total - len(waiting) - len(todo)
+        st.progress(finished / total, text=f"{finished}/{total} report(s) processed")
+        if st.button("Cancel batch"):
+            for job_id in waiting:
+                queue.cancel(job_id)
+            for name, _ in todo:
+                archive.add(BatchResult(name, None, "Cancelled"))
+            todo.clear()
+            st.rerun()
+        time.sleep(POLL_S)
+        st.rerun()
+
+    # Keep the result across the rerun triggered by the download button
+    st.session_state["batch_zip"] = archive.close()
+    st.session_state["batch_written"] = archive.written
+    st.session_state["batch_failures"] = archive.failures
+    batch_dir = st.session_state["batch_dir"]
+    if batch_dir is not None:
+        batch_dir.cleanup()
+    for name in ("batch_jobs", "batch_plans", "batch_todo", "batch_dir", "batch_archive", "batch_total"):
+        del st.session_state[name]
+
+
+# Rows of a cohort view shown on the page; the CSV download has all of them
+COHORT_PREVIEW_ROWS = 1000
+
+# (table, columns grouped by, label of the first one) for each view of the cohort store
+COHORT_VIEWS = {
+    "Domain scores": ("domain_scores", ["domain"], "Domain"),
+    "NPQ": ("npq_scores", ["domain"], "Domain"),
+    "Subtests": ("subtest_metrics", ["test", "metric", "part"], "Test"),
+    "Reports": ("reports", ["phq9_severity"], "PHQ-9 severity"),
+}
+
+
+# Filter and aggregate the stored results of every processed report
+def cohort_mode():
+    store = get_cohort_store()
+    if store is None:
+        st.info("Set CNSVS_COHORT_DB to a SQLite file to keep extracted results for cohort queries.")
+        return
+    st.write(f"{len(store)} report(s) in the cohort store.")
+
+    view = st.selectbox("Data", list(COHORT_VIEWS))
+    table, by, label = COHORT_VIEWS[view]
+    columns = TABLES[table]
+
+    filters = {}
+    chosen = st.multiselect(label, store.distinct(table, by[0]))
+    if chosen:
+        filters[by[0]] = chosen
+    if "grade" in columns:
+        grades = st.multiselect("Grade", store.distinct(table, "grade"))
+        if grades:
+            filters["grade"] = grades
+    if "flagged" in columns and st.checkbox("Flagged rows only"):
+        filters["flagged"] = 1
+    phq9_range = st.slider("PHQ-9 total score", 0, 27, (0, 27))
+    if phq9_range != (0, 27):
+        filters["phq9_score"] = phq9_range
+
+    st.write("Summary:")
+    summary = store.aggregate(table, by, filters)
+    st.dataframe(summary)
+
+    # Only the preview is read on each rerun; the CSV is built when downloaded
+    matching = int(summary["count"].sum())
+    shown = f", first {COHORT_PREVIEW_ROWS} shown" if matching > COHORT_PREVIEW_ROWS else ""
+    st.write(f"{matching} matching row(s){shown}:")
+    st.dataframe(store.query(table, filters, limit=COHORT_PREVIEW_ROWS))
+    st.download_button(
+        label="Download CSV",
+        data=lambda: store.query(table, filters).to_csv(index=False),
+        file_name=f"cnsvs_{table}.csv",
+        mime="text/csv"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import csv
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO, StringIO
+
+from export import EXTENSIONS, write_csv, write_csv_header, write_export
+from guard import StageFailed, get_runner, guarded_entry, start_runner
+from pipeline import process_report, summarize_report
+from report_cache import content_key
+from streaming import file_key, report_key
+
+# Outcome of one PDF in a batch: DOCX bytes and the report summary on success,
+# an error message otherwise; key is the PDF's content hash once it was read.
+# A guarded report whose stages partly failed has both a DOCX and an error
+BatchResult = namedtuple("BatchResult", ["name", "docx", "error", "data", "key"], defaults=(None, None))
+
+
+# Expand uploaded (name, bytes) pairs into individual PDFs, unpacking ZIP archives
+def iter_pdf_inputs(files):
+    for name, data in files:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                        continue
+                    # Skip the resource-fork entries macOS adds to archives
+                    if info.filename.startswith("__MACOSX/"):
+                        continue
+                    yield info.filename, archive.read(info)
+        else:
+            yield name, data
+
+
+# Every PDF below a folder, named relative to it
+def iter_pdf_dir(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.lower().endswith(".pdf"):
+                full_path = os.path.join(root, file_name)
+                with open(full_path, "rb") as f:
+                    yield os.path.relpath(full_path, path), f.read()
+
+
+# Turn one PDF into DOCX bytes and its summary; runs inside a worker process
+def process_pdf(name, pdf_bytes, render_docx=True):
+    try:
+        result = process_report(pdf_bytes, render_docx=render_docx)
+    except Exception as exc:
+        return BatchResult(name, None, f"{type(exc).__name__}: {exc}")
+    if render_docx and result["docx"] is None:
+        return BatchResult(name, None, "No data to convert to DOCX.", result["summary"], result["key"])
+    return BatchResult(name, result["docx"], None, result["summary"], result["key"])
+
+
+# process_pdf with every stage under a time budget in a killable child (see
+# guard.py); what worked is kept, failed stages go into the error. Partial
+# results get no summary, so they stay out of the cohort store
+def process_guarded_pdf(name, pdf_bytes, render_docx=True):
+    try:
+        entry = guarded_entry(pdf_bytes, render_docx=render_docx)
+    except Exception as exc:
+        return BatchResult(name, None, f"{type(exc).__name__}: {exc}")
+    key = content_key(pdf_bytes)
+    errors = entry["errors"]
+    summary = None if errors else summarize_report(entry)
+    error = _stage_errors(errors)
+    if render_docx and entry["docx"] is None:
+        return BatchResult(name, None, error or "No data to convert to DOCX.", summary, key)
+    return BatchResult(name, entry.get("docx"), error, summary, key)
+
+
+def _stage_errors(errors):
+    return "; ".join(f"{error.stage} {error.kind}: {error.message}" for error in errors) or None
+
+
+# Where the reports of a multi-patient PDF (a path) start and end: the file's
+# key and (first, end) page ranges, found in the stage child under its budget.
+# Job body for the app, which queues one process_split_report per range
+def plan_split_pdf(name, pdf_path):
+    try:
+        return file_key(pdf_path), get_runner().call("report_ranges", pdf_path)
+    except StageFailed as exc:
+        raise RuntimeError(_stage_errors([exc.error])) from None
+
+
+# Reports of a multi-patient PDF are named <name>_1.pdf, <name>_2.pdf, ...
+def split_report_name(name, number):
+    base, ext = posixpath.splitext(name)
+    return f"{base}_{number}{ext}"
+
+
+# One report of a multi-patient PDF: its pages cut out into a PDF of their own
+# in the stage child, then process_guarded_pdf; keyed by its page range
+def process_split_report(name, pdf_path, source_key, number, first, end, render_docx=True):
+    report_name = split_report_name(name, number)
+    key = report_key(source_key, first, end - 1)
+    try:
+        report_bytes = get_runner().call("report_pdf", pdf_path, first, end)
+    except StageFailed as exc:
+        return BatchResult(report_name, None, _stage_errors([exc.error]), None, key)
+    return process_guarded_pdf(report_name, report_bytes, render_docx)._replace(key=key)
+
+
+# A path for a PDF given as a path or bytes; bytes go to a temporary file
+@contextmanager
+def _pdf_path(pdf):
+    if not isinstance(pdf, (bytes, bytearray)):
+        yield pdf
+        return
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(pdf)
+    try:
+        yield f.name
+    finally:
+        os.remove(f.name)
+
+
+# One result per report in a multi-patient PDF (path or bytes), each yielded as
+# soon as it is done; every step runs guarded, as for the app's split jobs
+def iter_split_results(name, pdf, render_docx=True):
+    with _pdf_path(pdf) as pdf_path:
+        try:
+            source_key, ranges = plan_split_pdf(name, pdf_path)
+        except Exception as exc:
+            yield BatchResult(name, None, f"{type(exc).__name__}: {exc}")
+            return
+        for number, (first, end) in enumerate(ranges, start=1):
+            yield process_split_report(name, pdf_path, source_key, number, first, end, render_docx)
+
+
+# Output file stem for a source PDF, de-duplicated against the stems already used
+def unique_stem(name, used):
+    stem = posixpath.splitext(posixpath.basename(name.replace("\\", "/")))[0] or "report"
+    candidate = stem
+    counter = 2
+    while candidate in used:
+        candidate = f"{stem}_{counter}"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def run_batch(items, max_workers=None, render_docx=True, guarded=True):
+    """Process (name, pdf_bytes) pairs in a process pool, yielding results as they finish.
+
+    pdfplumber parsing is CPU-bound, so one worker process per core is used by
+    default. Only about two PDFs per worker are in flight at a time, which keeps
+    memory flat however many files the batch holds. With ``guarded`` (the
+    default) every PDF goes through ``process_guarded_pdf``, so one that makes
+    a stage hang fails only itself instead of holding up the run.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    process = process_guarded_pdf if guarded else process_pdf
+    if max_workers == 1:
+        for name, pdf_bytes in items:
+            yield process(name, pdf_bytes, render_docx)
+        return
+
+    # spawn keeps workers clear of the Streamlit server's threads and state;
+    # guarded workers start their stage child before the first PDF
+    context = multiprocessing.get_context("spawn")
+    initializer = start_runner if guarded else None
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=initializer) as pool:
+        pending = {}
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as exc:
+                    # A worker that died (e.g. out of memory) fails only its own file
+                    yield BatchResult(name, None, f"{type(exc).__name__}: {exc}")
+
+        for name, pdf_bytes in items:
+            pending[pool.submit(process, name, pdf_bytes, render_docx)] = name
+            if len(pending) >= 2 * max_workers:
+                yield from drain(FIRST_COMPLETED)
+        while pending:
+            yield from drain(FIRST_COMPLETED)
+
+
+class BatchZip:
+    """ZIP archive holding each report in the chosen ``formats``, written as results arrive.
+
+    ``formats`` are names from ``export.FORMATS``. DOCX, JSON and FHIR files
+    are one per report, each streamed straight into its archive entry. CSV
+    rows for every report go to one ``results.csv``. They are collected in a
+    temporary file until the archive is closed. Failed reports are written to
+    ``failures.csv`` on close. A partial result's DOCX is still written, but
+    only complete results get the other formats.
+    """
+
+    def __init__(self, fileobj=None, formats=("docx",)):
+        self.fileobj = fileobj if fileobj is not None else BytesIO()
+        self.formats = list(formats)
+        self.failures = []
+        self.written = 0
+        self._zip = zipfile.ZipFile(self.fileobj, "w", zipfile.ZIP_DEFLATED)
+        self._names = set()
+        self._data_formats = [fmt for fmt in self.formats if fmt != "docx"]
+        self._csv = None
+        if "csv" in self.formats:
+            self._csv = tempfile.TemporaryFile()
+            write_csv_header(self._csv)
+
+    def add(self, result):
+        if result.error is not None:
+            self.failures.append((result.name, result.error))
+        docx = result.docx if "docx" in self.formats else None
+        data = result.data if result.error is None and self._data_formats else None
+        if docx is None and data is None:
+            return
+        stem = unique_stem(result.name, self._names)
+        if docx is not None:
+            self._zip.writestr(f"{stem}.docx", docx)
+        if data is not None:
+            for fmt in self._data_formats:
+                if fmt == "csv":
+                    write_csv(self._csv, result.name, result.key, data, header=False)
+                else:
+                    with self._zip.open(stem + EXTENSIONS[fmt], "w") as entry:
+                        write_export(entry, fmt, result.name, result.key, data)
+        self.written += 1
+
+    def close(self):
+        if self._csv is not None:
+            self._csv.seek(0)
+            with self._zip.open("results.csv", "w") as entry:
+                shutil.copyfileobj(self._csv, entry)
+            self._csv.close()
+            self._csv = None
+        if self.failures:
+            summary = StringIO()
+            writer = csv.writer(summary)
+            writer.writerow(["file", "error"])
+            writer.writerows(self.failures)
+            self._zip.writestr("failures.csv", summary.getvalue())
+        self._zip.close()
+        return self.fileobj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,102 @@
+"""Check that every text engine gives the same extracted values.
+
+    python -m benchmarks.parity
+    python -m benchmarks.parity reports/*.pdf --engine pdfium
+
+Each PDF (or every PDF in a directory; synthetic reports when none are given)
+goes through ``parse_pdf`` once per engine. The subtest percentiles, flagged
+test data and GAD-7/PHQ-9 totals are compared against the pdfplumber
+reference, and the ``extract_text`` time of each engine is printed. Exits
+non-zero when any value differs, so it can gate a switch of the default
+engine.
+"""
+import argparse
+import os
+import sys
+from io import BytesIO
+
+from benchmarks.synthetic import make_report
+from instrumentation import PipelineMetrics
+from pipeline import extract_entry, parse_pdf
+from text_engines import ENGINES, PdfiumText
+
+REFERENCE = "pdfplumber"
+
+# Entry fields that come from page text; the tables always come from pdfplumber
+FIELDS = ["subtest_percentiles", "test_data", "gad7_score", "phq9_score"]
+
+# name -> make_report() arguments, as in benchmarks.run
+SYNTHETIC = {
+    "small": {},
+    "noisy": {"noise_lines": 40},
+    "long": {"response_pages": 40},
+}
+
+
+def _inputs(paths, seed):
+    if not paths:
+        for name, params in SYNTHETIC.items():
+            yield name, make_report(seed, **params)
+        return
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf"))
+        else:
+            files = [path]
+        for file in files:
+            with open(file, "rb") as f:
+                yield file, f.read()
+
+
+def _extract(data, engine):
+    metrics = PipelineMetrics()
+    entry = extract_entry(parse_pdf(BytesIO(data), metrics=metrics, text_engine=engine))
+    stats = metrics.stages.get("extract_text")
+    return entry, stats["wall_s"] if stats else 0.0
+
+
+def check(name, data, engines):
+    """Differing fields per engine for one PDF, and each engine's text time."""
+    reference, reference_s = _extract(data, REFERENCE)
+    mismatches = {}
+    timings = {REFERENCE: reference_s}
+    for engine in engines:
+        entry, seconds = _extract(data, engine)
+        timings[engine] = seconds
+        differing = [field for field in FIELDS if entry[field] != reference[field]]
+        if differing:
+            mismatches[engine] = differing
+    return mismatches, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", metavar="PDF", help="PDF files or directories (default: synthetic reports)")
+    parser.add_argument("--engine", action="append", choices=sorted(set(ENGINES) - {REFERENCE}),
+                        help="engine to check against pdfplumber (repeatable; default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic reports")
+    args = parser.parse_args(argv)
+
+    engines = args.engine or sorted(set(ENGINES) - {REFERENCE})
+    if "pdfium" in engines and not PdfiumText.available():
+        print("pypdfium2 is not installed; nothing to compare", file=sys.stderr)
+        return 2
+
+    failed = 0
+    checked = 0
+    for name, data in _inputs(args.paths, args.seed):
+        mismatches, timings = check(name, data, engines)
+        checked += 1
+        times = "  ".join(f"{engine} {seconds * 1000:.1f} ms" for engine, seconds in timings.items())
+        if mismatches:
+            failed += 1
+            detail = "; ".join(f"{engine}: {', '.join(fields)}" for engine, fields in mismatches.items())
+            print(f"MISMATCH {name}  {detail}  ({times})")
+        else:
+            print(f"ok {name}  ({times})")
+    print(f"{checked - failed}/{checked} reports match", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Per-stage benchmark of the extraction pipeline on synthetic reports.
+
+    python -m benchmarks.run --repeat 10 --output bench.json
+    python -m benchmarks.run --compare bench.json --threshold 1.25
+
+Every case runs in a fresh worker process, so the peak RSS it reports belongs
+to that case alone. Results are JSON with p50/p95/mean latency per stage.
+``--compare`` prints the p50 ratio against an earlier run and exits non-zero
+when a stage got slower than ``--threshold``.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+
+from subtests import SUBTEST_NAMES
+
+# name -> make_report() arguments
+CASES = {
+    "small": {},
+    "missing-subtests": {"missing": SUBTEST_NAMES[::2]},
+    "noisy": {"noise_lines": 40},
+    "long": {"response_pages": 40},
+}
+
+STAGES = [
+    "pdfplumber_open",
+    "page_index",
+    "extract_tables",
+    "extract_text",
+    "parse_pdf",
+    "extract_vbm_vsm_finger_tests",
+    "extract_gad7_phq9",
+    "csv_to_docx_with_flagging",
+]
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _summarize(seconds):
+    millis = [value * 1000 for value in seconds]
+    return {
+        "runs": len(millis),
+        "p50_ms": round(_percentile(millis, 50), 3),
+        "p95_ms": round(_percentile(millis, 95), 3),
+        "mean_ms": round(sum(millis) / len(millis), 3),
+        "min_ms": round(min(millis), 3),
+    }
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# Runs in a worker process: time every stage of one case `repeat` times
+def run_case(params, repeat, seed):
+    import pdfplumber
+
+    from benchmarks.synthetic import make_report
+    from page_index import build_page_index
+    from pipeline import (
+        combine_tables,
+        csv_to_docx_with_flagging,
+        extract_gad7_score,
+        extract_phq9_score,
+        extract_vbm_vsm_finger_tests,
+        interpret_phq9_score,
+        parse_pdf,
+        process_lower_table,
+        process_upper_table,
+    )
+
+    data = make_report(seed, **params)
+    timings = {stage: [] for stage in STAGES}
+
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def open_pdf():
+        with pdfplumber.open(BytesIO(data)) as pdf:
+            return len(pdf.pages)
+
+    # Each layout stage gets a fresh document so pdfplumber's page caches
+    # from one stage do not make the next look free
+    def all_tables():
+        with pdfplumber.open(BytesIO(data)) as pdf:
+            return [page.extract_tables() for page in pdf.pages]
+
+    def all_text():
+        with pdfplumber.open(BytesIO(data)) as pdf:
+            return [page.extract_text() for page in pdf.pages]
+
+    def questionnaires(report):
+        return extract_gad7_score(report), extract_phq9_score(report)
+
+    page_count = None
+    for _ in range(repeat):
+        page_count = timed("pdfplumber_open", open_pdf)
+        timed("page_index", build_page_index, data)
+        timed("extract_tables", all_tables)
+        timed("extract_text", all_text)
+        report = timed("parse_pdf", parse_pdf, BytesIO(data))
+        test_data = timed("extract_vbm_vsm_finger_tests", extract_vbm_vsm_finger_tests, report)
+        gad7_score, phq9_score = timed("extract_gad7_phq9", questionnaires, report)
+
+        _, upper_df = process_upper_table(report.tables)
+        _, lower_df = process_lower_table(report.tables)
+        combined_df = combine_tables(upper_df, lower_df)
+        timed("csv_to_docx_with_flagging", csv_to_docx_with_flagging,
+              combined_df, test_data, gad7_score, interpret_phq9_score(phq9_score))
+
+    return {
+        "pages": page_count,
+        "bytes": len(data),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": {stage: _summarize(values) for stage, values in timings.items()},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(case_names, repeat, seed=0):
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "cases": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for name in case_names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results["cases"][name] = pool.submit(run_case, CASES[name], repeat, seed).result()
+        print(f"{name}: done", file=sys.stderr)
+    return results
+
+
+# Print p50 ratios against an earlier run; returns the stages slower than threshold
+def compare(current, baseline, threshold):
+    regressions = []
+    print(f"{'case':<18} {'stage':<30} {'base p50':>10} {'now p50':>10} {'ratio':>7}")
+    for case, result in current["cases"].items():
+        base_case = baseline.get("cases", {}).get(case)
+        if base_case is None:
+            continue
+        for stage, stats in result["stages"].items():
+            base_stats = base_case["stages"].get(stage)
+            if base_stats is None or not base_stats["p50_ms"]:
+                continue
+            ratio = stats["p50_ms"] / base_stats["p50_ms"]
+            marker = " *" if ratio > threshold else ""
+            print(f"{case:<18} {stage:<30} {base_stats['p50_ms']:>10.2f} {stats['p50_ms']:>10.2f} {ratio:>7.2f}{marker}")
+            if ratio > threshold:
+                regressions.append((case, stage, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", action="append", choices=sorted(CASES),
+                        help="case to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic reports")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="p50 slowdown ratio counted as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    results = run(args.case or list(CASES), args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than {args.threshold}x baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Startup benchmark: how long a fresh process takes to serve its first report.
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --output startup.json
+
+Each run starts a new interpreter (spawn), imports the pipeline and processes
+the same synthetic report twice with ``prepare_report``. In the "warm" mode
+``warmup.warm_up`` runs first, as it does in the app's job workers. The gap
+between the first and second report is what a cold worker costs the first
+upload. Results are JSON with p50/p95/mean per step, as from benchmarks.run.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.run import _git_commit, _summarize
+
+MODES = ["cold", "warm"]
+STEPS = ["import", "warm_up", "first_report", "second_report"]
+
+
+# Runs in a fresh worker process
+def run_once(mode, data):
+    timings = {}
+
+    start = time.perf_counter()
+    from pipeline import prepare_report
+    from warmup import warm_up
+    timings["import"] = time.perf_counter() - start
+
+    if mode == "warm":
+        start = time.perf_counter()
+        warm_up()
+        timings["warm_up"] = time.perf_counter() - start
+
+    for step in ["first_report", "second_report"]:
+        start = time.perf_counter()
+        prepare_report(data, step)
+        timings[step] = time.perf_counter() - start
+    return timings
+
+
+def run(modes, repeat, seed=0):
+    from benchmarks.synthetic import make_report
+
+    data = make_report(seed)
+    results = {"meta": {"commit": _git_commit(), "repeat": repeat, "seed": seed}, "modes": {}}
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        samples = {step: [] for step in STEPS}
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                timings = pool.submit(run_once, mode, data).result()
+            for step, seconds in timings.items():
+                samples[step].append(seconds)
+        results["modes"][mode] = {step: _summarize(values) for step, values in samples.items() if values}
+        print(f"{mode}: done", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", action="append", choices=MODES, help="mode to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per mode (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic report")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args.mode or MODES, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Synthetic CNSVS-style report PDFs for benchmarks.
+
+The PDFs are written directly (Helvetica text plus ruled grid tables), so no
+PDF library is needed to produce them. The layout mirrors what the pipeline
+expects: a patient table and the domain-score table on page 1, the NPQ
+Domain / Score / Severity table on page 2, subtest sections with
+``<metric> <score> <standard> <percentile>`` rows, the GAD-7/PHQ-9 totals,
+and optional questionnaire-response pages and noise lines to make long or
+messy reports. ``make_reports`` puts several reports into one file, as a
+multi-patient export does.
+"""
+import random
+
+from subtests import SUBTESTS
+
+DOMAINS = [
+    "Neurocognition Index", "Composite Memory", "Verbal Memory", "Visual Memory",
+    "Psychomotor Speed", "Reaction Time*", "Complex Attention*", "Cognitive Flexibility",
+    "Processing Speed", "Executive Function", "Simple Attention", "Motor Speed",
+]
+
+NPQ_DOMAINS = [
+    "Attention", "Impulsive", "Learning", "Memory", "Anxiety", "Panic", "Agoraphobia",
+    "Obsessions & Compulsions", "Social Anxiety", "Depression", "Mood Stability", "Mania",
+]
+
+SEVERITIES = ["Not a problem", "Mild", "Moderate", "Severe"]
+
+PAGE_TOP = 760
+PAGE_BOTTOM = 60
+LINE_HEIGHT = 12
+ROW_HEIGHT = 14
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class _Page:
+    def __init__(self):
+        self.lines = []
+        self.tables = []
+
+    def stream(self):
+        ops = ["BT /F1 9 Tf"]
+        for x, y, text in self.lines:
+            ops.append(f"1 0 0 1 {x} {y} Tm ({_escape(text)}) Tj")
+        ops.append("ET")
+        for x, top, rows, widths in self.tables:
+            xs = [x]
+            for width in widths:
+                xs.append(xs[-1] + width)
+            ys = [top - i * ROW_HEIGHT for i in range(len(rows) + 1)]
+            for y in ys:
+                ops.append(f"{xs[0]} {y} m {xs[-1]} {y} l S")
+            for line_x in xs:
+                ops.append(f"{line_x} {ys[0]} m {line_x} {ys[-1]} l S")
+            ops.append("BT /F1 8 Tf")
+            for r, row in enumerate(rows):
+                for c, cell in enumerate(row):
+                    ops.append(f"1 0 0 1 {xs[c] + 2} {ys[r] - 10} Tm ({_escape(cell)}) Tj")
+            ops.append("ET")
+        return "\n".join(ops).encode("latin-1")
+
+
+# Serialise pages into a minimal, valid PDF 1.4 file
+def _write_pdf(pages):
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    number = 4
+    for page in pages:
+        data = page.stream()
+        objects[number + 1] = b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+        objects[number] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                           b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (number + 1))
+        kids.append(number)
+        number += 2
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{kid} 0 R" for kid in kids).encode(), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for key in sorted(objects):
+        offsets[key] = len(out)
+        out += b"%d 0 obj\n" % key + objects[key] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % number
+    for key in range(1, number):
+        out += b"%010d 00000 n \n" % offsets[key]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, xref)
+    return bytes(out)
+
+
+class _Writer:
+    """Flows text lines down the pages, starting a new page when one is full."""
+
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.page = _Page()
+        self.pages.append(self.page)
+        self.y = PAGE_TOP
+
+    def line(self, text):
+        if self.y < PAGE_BOTTOM:
+            self.new_page()
+        self.page.lines.append((40, self.y, text))
+        self.y -= LINE_HEIGHT
+
+    def table(self, rows, widths):
+        if self.y - ROW_HEIGHT * len(rows) < PAGE_BOTTOM:
+            self.new_page()
+        self.page.tables.append((40, self.y, rows, widths))
+        self.y -= ROW_HEIGHT * len(rows) + LINE_HEIGHT
+
+
+def _metric_line(rnd, label):
+    return f"{label} {rnd.randint(1, 120)} {rnd.randint(40, 140)} {rnd.randint(1, 99)}"
+
+
+def make_report(seed=0, missing=(), noise_lines=0, response_pages=0):
+    """Bytes of one synthetic report.
+
+    ``missing`` names subtests (see subtests.SUBTEST_NAMES) to leave out,
+    ``noise_lines`` adds that many filler lines after every subtest, and
+    ``response_pages`` appends questionnaire-response pages, each holding a
+    ruled table, before the GAD-7/PHQ-9 totals.
+    """
+    writer = _Writer()
+    _write_report(writer, seed, missing, noise_lines, response_pages)
+    return _write_pdf(writer.pages)
+
+
+def make_reports(count, seed=0, **kwargs):
+    """Bytes of one PDF holding ``count`` reports back to back, as in a
+    multi-patient export. Report ``i`` is ``make_report(seed + i, **kwargs)``.
+    """
+    writer = _Writer()
+    for i in range(count):
+        if i:
+            writer.new_page()
+        _write_report(writer, seed + i, **kwargs)
+    return _write_pdf(writer.pages)
+
+
+def _write_report(writer, seed, missing=(), noise_lines=0, response_pages=0):
+    rnd = random.Random(seed)
+    writer.line("CNS Vital Signs Report")
+    writer.table([["Patient ID", "Age", "Test Date"], [f"P{seed:05d}", str(rnd.randint(18, 90)), "2024-01-01"]],
+                 [120, 60, 100])
+    domain_rows = [["Domain Scores", "Patient Score", "Standard Score", "Percentile", "VI**"]]
+    for domain in DOMAINS:
+        domain_rows.append([domain, str(rnd.randint(10, 120)), str(rnd.randint(60, 130)),
+                            str(rnd.randint(1, 99)), rnd.choice(["Yes", "No"])])
+    writer.table(domain_rows, [150, 80, 80, 70, 40])
+
+    writer.new_page()
+    writer.line("NeuroPsych Questionnaire (NPQ) SF-45")
+    npq_rows = [["Domain", "Score", "Severity"]]
+    for domain in NPQ_DOMAINS:
+        npq_rows.append([domain, str(rnd.randint(0, 30)), rnd.choice(SEVERITIES)])
+    writer.table(npq_rows, [160, 60, 100])
+
+    writer.new_page()
+    for name, metrics in SUBTESTS:
+        if name in missing:
+            continue
+        writer.line(name)
+        writer.line("Score Standard Percentile")
+        for metric in metrics:
+            if isinstance(metric, tuple):
+                group, labels = metric
+                writer.line(group)
+                for label in labels:
+                    writer.line(_metric_line(rnd, label))
+            else:
+                writer.line(_metric_line(rnd, metric))
+        for i in range(noise_lines):
+            writer.line(f"Validity indicator note {i}: {rnd.randint(100, 999)} responses reviewed")
+
+    for page_number in range(response_pages):
+        writer.new_page()
+        writer.line(f"Questionnaire Item Responses ({page_number + 1})")
+        rows = [["Question", "Response", "Points"]]
+        for item in range(30):
+            rows.append([f"Item {item + 1}: how often have you been bothered",
+                         rnd.choice(["Never", "Sometimes", "Often", "Always"]), str(rnd.randint(0, 3))])
+        writer.table(rows, [260, 100, 60])
+
+    writer.new_page()
+    writer.line(f"GAD-7 Anxiety Severity {rnd.randint(0, 21)}")
+    writer.line(f"PHQ-9 Score {rnd.randint(1, 27)}")
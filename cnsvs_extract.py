@@ -0,0 +1,137 @@
+"""Headless CNSVS extraction: ``cnsvs-extract INPUT... OUTPUT_DIR``.
+
+Reads PDFs (or folders / ZIP archives of them), writes one DOCX per report and
+the extracted values as JSON or a FHIR-style bundle (one file per report, see
+export.py) or CSV (one ``results.csv`` for the whole run). With ``--store``
+the values are also added to a SQLite cohort store (see cohort_store.py).
+Each PDF's stages run under time budgets (see guard.py), and with ``--split``
+so do finding and cutting out each report; a PDF or report that runs over one
+is reported as failed and the run carries on.
+Heavy libraries are only imported once there is work to do, so ``--help`` and
+argument errors return immediately, and Streamlit is never loaded.
+"""
+import argparse
+import os
+import sys
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cnsvs-extract",
+        description="Extract CNSVS report data from PDFs into DOCX and JSON/CSV files.",
+    )
+    parser.add_argument("inputs", nargs="+", metavar="INPUT",
+                        help="PDF files, ZIP archives of PDFs, or folders searched recursively")
+    parser.add_argument("output_dir", metavar="OUTPUT_DIR", help="folder the results are written to")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes to use (default: one per CPU core)")
+    parser.add_argument("-f", "--format", choices=["json", "csv", "fhir"], default="json",
+                        help="format for the extracted values (default: json)")
+    parser.add_argument("--no-docx", action="store_true", help="skip building the DOCX reports")
+    parser.add_argument("--split", action="store_true",
+                        help="inputs are multi-patient exports: write one result per report, cutting each report "
+                             "out of its file and processing the reports one at a time (--jobs is not used)")
+    parser.add_argument("--store", metavar="DB",
+                        help="SQLite cohort store to add the extracted values to (reports already in it are skipped)")
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
+# (name, pdf_bytes) for every PDF named on the command line
+def iter_inputs(paths):
+    from batch import iter_pdf_dir, iter_pdf_inputs
+
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_pdf_dir(path)
+        else:
+            with open(path, "rb") as f:
+                yield from iter_pdf_inputs([(os.path.basename(path), f.read())])
+
+
+# (name, path or bytes) for every PDF, without reading files from disk up front
+def iter_split_inputs(paths):
+    from batch import iter_pdf_inputs
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(".pdf"):
+                        full_path = os.path.join(root, file_name)
+                        yield os.path.relpath(full_path, path), full_path
+        elif path.lower().endswith(".zip"):
+            with open(path, "rb") as f:
+                yield from iter_pdf_inputs([(os.path.basename(path), f.read())])
+        else:
+            yield os.path.basename(path), path
+
+
+# Every report of every multi-patient input, in order
+def iter_split_results(paths, render_docx=True):
+    from batch import iter_split_results as split_pdf
+
+    for name, pdf in iter_split_inputs(paths):
+        yield from split_pdf(name, pdf, render_docx)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from batch import run_batch, unique_stem
+    from export import EXTENSIONS, write_csv, write_csv_header, write_export
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    used_stems = set()
+    failures = []
+    processed = 0
+
+    store = None
+    stored = 0
+    if args.store:
+        from cohort_store import CohortStore
+        store = CohortStore(args.store)
+
+    csv_file = None
+    if args.format == "csv":
+        csv_file = open(os.path.join(args.output_dir, "results.csv"), "wb")
+        write_csv_header(csv_file)
+
+    try:
+        if args.split:
+            results = iter_split_results(args.inputs, render_docx=not args.no_docx)
+        else:
+            results = run_batch(iter_inputs(args.inputs), max_workers=args.jobs, render_docx=not args.no_docx)
+        for result in results:
+            if store is not None and result.data is not None:
+                stored += store.ingest(result.key, result.data, result.name)
+            if result.error is not None:
+                failures.append(result)
+                print(f"FAILED {result.name}: {result.error}", file=sys.stderr)
+                continue
+
+            stem = unique_stem(result.name, used_stems)
+            if result.docx is not None:
+                with open(os.path.join(args.output_dir, f"{stem}.docx"), "wb") as f:
+                    f.write(result.docx)
+            if csv_file is not None:
+                write_csv(csv_file, result.name, result.key, result.data, header=False)
+            else:
+                with open(os.path.join(args.output_dir, stem + EXTENSIONS[args.format]), "wb") as f:
+                    write_export(f, args.format, result.name, result.key, result.data)
+            processed += 1
+            print(f"ok {result.name}")
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+
+    print(f"{processed} report(s) processed, {len(failures)} failed", file=sys.stderr)
+    if store is not None:
+        print(f"{stored} new report(s) added to {args.store}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
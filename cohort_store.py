@@ -0,0 +1,261 @@
+"""Local SQLite store of extracted results for cohort and longitudinal queries.
+
+Every processed report is added as rows in four indexed tables:
+
+- ``reports``: one row per report, with the GAD-7/PHQ-9 totals.
+- ``domain_scores``: the domain percentiles.
+- ``npq_scores``: the NPQ scores and severities.
+- ``subtest_metrics``: the subtest percentiles.
+
+Reports are keyed by the SHA-256 of the PDF bytes (``report_cache.content_key``),
+so ingesting the same report again is a no-op. ``query`` and ``aggregate``
+filter and group across any number of reports in SQL, without touching the
+PDFs. Rows are built from ``pipeline.summarize_report`` output, which is what
+the app, the batch workers and ``cnsvs-extract`` already produce.
+"""
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    ingested_at TEXT NOT NULL,
+    gad7_score INTEGER,
+    gad7_severity TEXT,
+    phq9_score INTEGER,
+    phq9_severity TEXT
+);
+CREATE TABLE IF NOT EXISTS domain_scores (
+    key TEXT NOT NULL REFERENCES reports (key),
+    domain TEXT,
+    percentile INTEGER,
+    grade TEXT,
+    flagged INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS npq_scores (
+    key TEXT NOT NULL REFERENCES reports (key),
+    domain TEXT,
+    score INTEGER,
+    severity TEXT,
+    grade TEXT,
+    flagged INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subtest_metrics (
+    key TEXT NOT NULL REFERENCES reports (key),
+    test TEXT,
+    metric TEXT,
+    part TEXT,
+    percentile INTEGER,
+    grade TEXT,
+    flagged INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS domain_scores_key ON domain_scores (key);
+CREATE INDEX IF NOT EXISTS domain_scores_domain ON domain_scores (domain, percentile);
+CREATE INDEX IF NOT EXISTS npq_scores_key ON npq_scores (key);
+CREATE INDEX IF NOT EXISTS npq_scores_domain ON npq_scores (domain, score);
+CREATE INDEX IF NOT EXISTS subtest_metrics_key ON subtest_metrics (key);
+CREATE INDEX IF NOT EXISTS subtest_metrics_test ON subtest_metrics (test, metric, percentile);
+"""
+
+# Columns of every table, in insert order
+TABLES = {
+    "reports": ["key", "name", "ingested_at", "gad7_score", "gad7_severity", "phq9_score", "phq9_severity"],
+    "domain_scores": ["key", "domain", "percentile", "grade", "flagged"],
+    "npq_scores": ["key", "domain", "score", "severity", "grade", "flagged"],
+    "subtest_metrics": ["key", "test", "metric", "part", "percentile", "grade", "flagged"],
+}
+
+# Numeric column each table aggregates by default
+VALUE_COLUMNS = {
+    "reports": "phq9_score",
+    "domain_scores": "percentile",
+    "npq_scores": "score",
+    "subtest_metrics": "percentile",
+}
+
+def summary_rows(key, summary, name=None):
+    """Rows for every table from one ``summarize_report`` result, keyed by ``key``."""
+    ingested_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    return {
+        "reports": [(key, name, ingested_at, summary["gad7_score"], summary["gad7_severity"],
+                     summary["phq9_score"], summary["phq9_severity"])],
+        "domain_scores": [
+            (key, row["domain"], row["percentile"], row["grade"], int(row["flagged"]))
+            for row in summary["domain_scores"]
+        ],
+        "npq_scores": [
+            (key, row["domain"], row["score"], row["severity"], row["grade"], int(row["flagged"]))
+            for row in summary["npq"]
+        ],
+        "subtest_metrics": [
+            (key, row["test"], row["metric"], row["part"], row["percentile"], row["grade"], int(row["flagged"]))
+            for row in summary["subtests"]
+        ],
+    }
+
+
+class CohortStore:
+    """Extracted results of many reports in one SQLite file.
+
+    Each call opens its own connection, so one store can be shared by every
+    Streamlit session thread. The database runs in WAL mode, so readers do not
+    block an ingest that is in progress.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __contains__(self, key):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM reports WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def keys(self):
+        """Keys of every stored report, as a set."""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT key FROM reports")}
+
+    def ingest(self, key, summary, name=None):
+        """Add one report; False when its key is already stored."""
+        return self.ingest_many([(key, summary, name)]) == 1
+
+    def ingest_many(self, reports):
+        """Add (key, summary, name) triples in one transaction; returns how many were new."""
+        added = 0
+        with self._connect() as conn:
+            for key, summary, name in reports:
+                added += self._insert(conn, summary_rows(key, summary, name))
+        return added
+
+    def replace_many(self, reports):
+        """Replace the rows of (key, summary, name) triples, e.g. after a re-grade.
+
+        A None name keeps the name already stored. Keys not in the store yet
+        are added. Returns how many reports were written.
+        """
+        written = 0
+        with self._connect() as conn:
+            for key, summary, name in reports:
+                if name is None:
+                    row = conn.execute("SELECT name FROM reports WHERE key = ?", (key,)).fetchone()
+                    name = row[0] if row is not None else None
+                # Row tables first, then the report they reference
+                for table in reversed(list(TABLES)):
+                    conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                written += self._insert(conn, summary_rows(key, summary, name))
+        return written
+
+    # Insert one report's rows; 0 when its key is already stored
+    def _insert(self, conn, rows):
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO reports VALUES ({', '.join('?' * len(TABLES['reports']))})",
+            rows["reports"][0],
+        )
+        if cursor.rowcount == 0:
+            return 0
+        for table, columns in TABLES.items():
+            if table != "reports" and rows[table]:
+                conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", rows[table])
+        return 1
+
+    # SQL reference for a filter or group column: the table's own, else the report's
+    def _column(self, table, column):
+        if column in TABLES[table]:
+            return f"t.{column}"
+        if column in TABLES["reports"]:
+            return f"r.{column}"
+        raise ValueError(f"unknown column for {table}: {column!r}")
+
+    def _select(self, table, filters):
+        if table not in TABLES:
+            raise ValueError(f"unknown table: {table!r}")
+        clauses = []
+        params = []
+        for column, value in (filters or {}).items():
+            ref = self._column(table, column)
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    clauses.append(f"{ref} >= ?")
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f"{ref} <= ?")
+                    params.append(high)
+            elif isinstance(value, (list, set, frozenset)):
+                values = list(value)
+                clauses.append(f"{ref} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            elif value is None:
+                clauses.append(f"{ref} IS NULL")
+            else:
+                clauses.append(f"{ref} = ?")
+                params.append(value)
+        source = f"{table} t"
+        if table != "reports":
+            source += " JOIN reports r ON r.key = t.key"
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return source, where, params
+
+    def query(self, table, filters=None, limit=None):
+        """Rows of ``table`` matching ``filters``, as a DataFrame.
+
+        ``filters`` maps a column of the table (or of ``reports``, such as
+        ``phq9_score``) to a value, a list of accepted values, or an inclusive
+        ``(low, high)`` tuple where either end may be None. Row tables come back
+        with the report's name and ingest time.
+        """
+        source, where, params = self._select(table, filters)
+        columns = "t.*" if table == "reports" else "t.*, r.name, r.ingested_at"
+        sql = f"SELECT {columns} FROM {source}{where} ORDER BY t.rowid"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def aggregate(self, table, by, filters=None, value=None):
+        """Count, mean, min and max of ``value`` per ``by`` group, plus flagged rows.
+
+        ``value`` defaults to the table's main score (``VALUE_COLUMNS``).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        value = self._column(table, value or VALUE_COLUMNS[table])
+        groups = [self._column(table, column) for column in by]
+        source, where, params = self._select(table, filters)
+        flagged = ", SUM(t.flagged) AS flagged" if "flagged" in TABLES[table] else ""
+        select = ", ".join(f"{ref} AS {column}" for ref, column in zip(groups, by))
+        sql = (f"SELECT {select}, COUNT(*) AS count, COUNT(DISTINCT t.key) AS reports, "
+               f"AVG({value}) AS mean, MIN({value}) AS min, MAX({value}) AS max{flagged} "
+               f"FROM {source}{where} GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}")
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def distinct(self, table, column):
+        """Sorted distinct non-null values of one column, e.g. for filter choices."""
+        ref = self._column(table, column)
+        source, _, _ = self._select(table, None)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                f"SELECT DISTINCT {ref} FROM {source} WHERE {ref} IS NOT NULL ORDER BY {ref}")]
@@ -0,0 +1,220 @@
+"""Multi-format export of processed reports: DOCX, JSON, CSV and a FHIR bundle.
+
+Every format is written from the same two views of a report, built together
+by ``pipeline.report_views``. The summary, with every result as a typed
+number, grade and flag, feeds JSON, CSV and FHIR; the ``ReportModel`` feeds
+the DOCX. Batch results already carry both (the summary
+and the DOCX bytes), so no format ever needs another pipeline run. Writers
+take an open binary stream, either a download buffer or an entry of the batch
+ZIP, and serialize straight into it. No rendered document has to wait in
+memory for the others.
+
+The FHIR output is a ``collection`` Bundle in the FHIR R4 style: a
+DiagnosticReport for the report (with any clinician notes as its conclusion)
+and one Observation per result. These are the domain percentiles, the NPQ
+scores, the subtest percentiles and the GAD-7/PHQ-9 totals. CNSVS results have
+no LOINC codes, so codes are text only. Observations that are flagged in the
+DOCX are interpreted as abnormal ("A"), as are GAD-7 and PHQ-9 totals above
+minimal. A severity that cannot be read, such as an out-of-range score, is
+exported as text only.
+"""
+import csv
+import io
+import json
+import uuid
+from contextlib import contextmanager
+
+from pipeline import report_views
+from render import DEFAULT_TEMPLATE
+
+FORMATS = ["docx", "json", "csv", "fhir"]
+
+EXTENSIONS = {
+    "docx": ".docx",
+    "json": ".json",
+    "csv": ".csv",
+    "fhir": ".fhir.json",
+}
+
+MIME_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "json": "application/json",
+    "csv": "text/csv",
+    "fhir": "application/fhir+json",
+}
+
+# One row per result; the grade of an NPQ row is its severity
+CSV_COLUMNS = ["file", "section", "item", "value", "grade", "flagged"]
+
+INTERPRETATION_SYSTEM = "http://terminology.hl7.org/CodeSystem/v3-ObservationInterpretation"
+CATEGORY_SYSTEM = "http://terminology.hl7.org/CodeSystem/observation-category"
+
+# Whether a GAD-7/PHQ-9 severity (pipeline.classify_gad7_score,
+# classify_phq9_score) is abnormal: anything above minimal
+SEVERITY_FLAGGED = {
+    "None-Minimal anxiety": False,
+    "Mild anxiety": True,
+    "Moderate anxiety": True,
+    "Severe anxiety": True,
+    "Minimal depression": False,
+    "Mild depression": True,
+    "Moderate depression": True,
+    "Moderately severe depression": True,
+    "Severe depression": True,
+}
+
+
+# Flatten a report summary into long-format CSV rows
+def summary_rows(name, summary):
+    for row in summary["domain_scores"]:
+        yield [name, "Domain Scores", row["domain"], row["percentile"], row["grade"], row["flagged"]]
+    for row in summary["npq"]:
+        yield [name, "NPQ", row["domain"], row["score"], row["severity"], row["flagged"]]
+    for row in summary["subtests"]:
+        item = row["metric"] if row["part"] is None else f"{row['metric']} - {row['part']}"
+        yield [name, row["test"], item, row["percentile"], row["grade"], row["flagged"]]
+
+    for label, prefix in [("GAD-7", "gad7"), ("PHQ-9", "phq9")]:
+        severity = summary[f"{prefix}_severity"]
+        yield [name, label, "Total Score", summary[f"{prefix}_score"], severity, SEVERITY_FLAGGED.get(severity)]
+    for note in summary.get("notes") or []:
+        yield [name, "Notes", None, note, None, None]
+
+
+# A text view of a binary stream, detached afterwards so the stream stays open
+@contextmanager
+def _text(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        yield text
+    finally:
+        text.flush()
+        text.detach()
+
+
+def write_json(stream, name, key, summary):
+    with _text(stream) as f:
+        json.dump({"file": name, "key": key, **summary}, f, indent=2)
+
+
+def write_csv_header(stream):
+    with _text(stream) as f:
+        csv.writer(f).writerow(CSV_COLUMNS)
+
+
+# Several reports share one CSV: pass header=False for all but the first
+def write_csv(stream, name, key, summary, header=True):
+    if header:
+        write_csv_header(stream)
+    with _text(stream) as f:
+        csv.writer(f).writerows(summary_rows(name, summary))
+
+
+# flagged=None leaves the interpretation as text only
+def _observation(key, category, code, value, grade=None, flagged=False, unit=None):
+    resource = {
+        "resourceType": "Observation",
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"urn:sha256:{key}/{code}")),
+        "status": "final",
+        "category": [{"coding": [{"system": CATEGORY_SYSTEM, "code": category}]}],
+        "code": {"text": code},
+    }
+    if unit is None:
+        resource["valueInteger"] = value
+    else:
+        resource["valueQuantity"] = {"value": value, "unit": unit}
+    if grade is not None:
+        interpretation = {}
+        if flagged is not None:
+            interpretation["coding"] = [{"system": INTERPRETATION_SYSTEM, "code": "A" if flagged else "N"}]
+        interpretation["text"] = grade
+        resource["interpretation"] = [interpretation]
+    return resource
+
+
+def fhir_bundle(name, key, summary):
+    """The report as a FHIR-style Bundle dict (see the module docstring)."""
+    observations = []
+    for row in summary["domain_scores"]:
+        if row["percentile"] is not None:
+            observations.append(_observation(key, "exam", f"CNSVS {row['domain']}", row["percentile"], row["grade"],
+                                             row["flagged"], "percentile"))
+    for row in summary["npq"]:
+        if row["score"] is not None:
+            observations.append(_observation(key, "survey", f"NPQ SF-45 {row['domain']}", row["score"],
+                                             row["severity"], row["flagged"]))
+    for row in summary["subtests"]:
+        label = f"{row['test']} {row['metric']}" + (f" {row['part']}" if row["part"] else "")
+        observations.append(_observation(key, "exam", label, row["percentile"], row["grade"], row["flagged"],
+                                         "percentile"))
+    for label, prefix in [("GAD-7", "gad7"), ("PHQ-9", "phq9")]:
+        score = summary[f"{prefix}_score"]
+        severity = summary[f"{prefix}_severity"]
+        if score is not None:
+            observations.append(_observation(key, "survey", f"{label} total score", score, severity,
+                                             SEVERITY_FLAGGED.get(severity)))
+
+    report = {
+        "resourceType": "DiagnosticReport",
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"urn:sha256:{key}")),
+        "identifier": [{"system": "urn:ietf:rfc:3986", "value": f"urn:sha256:{key}"}],
+        "status": "final",
+        "code": {"text": "CNS Vital Signs report"},
+        "result": [{"reference": f"urn:uuid:{observation['id']}"} for observation in observations],
+    }
+    if name:
+        report["identifier"].append({"value": name})
+    if summary.get("notes"):
+        report["conclusion"] = "\n".join(summary["notes"])
+    return {
+        "resourceType": "Bundle",
+        "type": "collection",
+        "entry": [{"fullUrl": f"urn:uuid:{resource['id']}", "resource": resource}
+                  for resource in [report, *observations]],
+    }
+
+
+def write_fhir(stream, name, key, summary):
+    with _text(stream) as f:
+        json.dump(fhir_bundle(name, key, summary), f, indent=2)
+
+
+WRITERS = {
+    "json": write_json,
+    "csv": write_csv,
+    "fhir": write_fhir,
+}
+
+
+def write_export(stream, fmt, name, key, summary, docx=None):
+    """Serialize one format of a report into ``stream``; DOCX needs its bytes."""
+    if fmt == "docx":
+        if docx is None:
+            raise ValueError("no DOCX to export")
+        stream.write(docx)
+    elif fmt in WRITERS:
+        WRITERS[fmt](stream, name, key, summary)
+    else:
+        raise ValueError(f"unknown export format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+
+def export_entry(entry, name, key, formats=FORMATS):
+    """``{format: bytes}`` for one extracted entry, graded once for every format.
+
+    The entry's cached DOCX is used when it has one. DOCX is left out when
+    there is nothing to render.
+    """
+    summary, model = report_views(entry)
+    exports = {}
+    for fmt in formats:
+        docx = None
+        if fmt == "docx":
+            docx = entry.get("docx")
+            if docx is None and model is not None:
+                docx = DEFAULT_TEMPLATE.render(model)
+            if docx is None:
+                continue
+        buffer = io.BytesIO()
+        write_export(buffer, fmt, name, key, summary, docx)
+        exports[fmt] = buffer.getvalue()
+    return exports
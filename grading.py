@@ -0,0 +1,86 @@
+"""Column-at-a-time cleaning and grading of extracted table values.
+
+These are the vectorized forms of ``pipeline.clean_percentile``,
+``clean_score``, ``grading_system`` and ``grading_system_2``. They take a
+whole column, or the same column from many reports concatenated together,
+and give the same values and dtypes as ``Series.apply`` with the scalar
+functions.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Version of the grading rules: the bands here and in pipeline.grading_system,
+# grading_system_2, apply_flagging, classify_gad7_score and
+# classify_phq9_score. Bump it with any change to them; cached reports
+# graded under another version are re-derived from their raw values
+# (pipeline.regrade_entry) the next time they are read, or in bulk with
+# cnsvs-regrade.
+RULES_VERSION = "1"
+
+# First run of digits in a cell, as clean_percentile/clean_score read it
+NUMBER_PATTERN = re.compile(r"(\d+)")
+
+# NPQ severities that grading_system_2 flags
+FLAG_SEVERITIES = ["Mild", "Moderate", "Severe"]
+
+
+def clean_numbers(values):
+    """Leading integer of every cell, NaN where a cell has no digits.
+
+    Like ``values.apply(clean_percentile)``, the result is int64 when every
+    cell has a number, object (all None) when none has, and float64 otherwise.
+    """
+    # Report columns repeat a small set of cell strings, so parse each
+    # distinct string once and spread the numbers back over the rows
+    codes, uniques = pd.factorize(values.astype(str), use_na_sentinel=False)
+    digits = pd.Series(uniques, dtype=object).str.extract(NUMBER_PATTERN, expand=False)
+    numbers = pd.to_numeric(digits).to_numpy()
+    if np.isnan(numbers).all():
+        # apply gives an object column of None when no cell has a number
+        return pd.Series([None] * len(values), index=values.index, dtype=object)
+    return pd.Series(numbers[codes], index=values.index)
+
+
+def grade_percentiles(percentiles):
+    """Grade of every percentile, the same bands as ``grading_system``."""
+    if percentiles.empty:
+        # apply on an empty column keeps its dtype
+        return percentiles.copy()
+    values = percentiles.to_numpy(dtype=float)
+    conditions = [
+        values > 74,
+        (values >= 25) & (values <= 74),
+        (values >= 9) & (values <= 24),
+        (values >= 2) & (values <= 8),
+    ]
+    grades = np.select(conditions, ["Above Average", "Average", "Low Average", "Low"], default="Very Low")
+    return pd.Series(grades, index=percentiles.index)
+
+
+def flag_severities(severities):
+    """"FLAG" for a flagged NPQ severity and None otherwise, as ``grading_system_2``."""
+    if severities.empty:
+        return severities.copy()
+    flags = np.where(severities.isin(FLAG_SEVERITIES).to_numpy(), "FLAG", None)
+    # Infer the dtype from the values, as apply does
+    return pd.Series(flags, index=severities.index).infer_objects()
+
+
+def grade_domain_scores(df):
+    """Copy of a Domain Scores/Percentile frame, cleaned and graded."""
+    graded = df.copy()
+    graded["Percentile"] = clean_numbers(graded["Percentile"])
+    graded = graded.dropna(subset=["Percentile"])
+    graded["Grade"] = grade_percentiles(graded["Percentile"])
+    return graded
+
+
+def grade_npq_scores(df):
+    """Copy of a Domain/Score/Severity frame, cleaned and flagged."""
+    graded = df.copy()
+    graded["Score"] = clean_numbers(graded["Score"])
+    graded = graded.dropna(subset=["Score"])
+    graded["Grade"] = flag_severities(graded["Severity"])
+    return graded
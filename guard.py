@@ -0,0 +1,317 @@
+"""Timeout-guarded extraction in a child process that can be killed.
+
+A malformed or oddly laid out PDF can make pdfplumber's table finder crawl
+or make a pattern backtrack for minutes. Run in the job worker itself, that
+holds the worker, and the user, until it finishes. Here the stages of
+``extract_entry`` run one at a time in a child process of the job worker,
+each under a wall-clock budget (and a CPU limit where ``resource`` is
+available). A stage that runs over its budget is killed with its child, and
+the next stage gets a fresh child. Each stage is measured in the child, with
+the same stage names as inline, and its ``PipelineMetrics`` are merged into
+the caller's. A killed stage only has the wall time its caller waited.
+
+The page index (see page_index.py) is built once, in its own stage, and
+handed to both the text and the table stage. Stages are independent where
+the data allows it. A report whose tables time out still gets its subtests,
+questionnaires and DOCX, and without an index every page is parsed. Each failed stage comes
+back as a ``StageError``, in ``entry["errors"]``, and the stages that need
+its output are reported as skipped. ``prepare_guarded_report`` is the job
+body the app queues in place of ``pipeline.prepare_report``.
+
+A multi-report PDF is split in the child too: ``report_ranges`` finds where
+each report starts and ``report_pdf`` cuts one out, and each report's PDF
+then goes through the stages above (see batch.py).
+"""
+import math
+import multiprocessing
+import signal
+import threading
+import time
+from collections import namedtuple
+from io import BytesIO
+
+from instrumentation import PipelineMetrics, stage, start_tracing
+from page_index import build_page_index
+from pipeline import ParsedReport, derive_entry, extract_gad7_raw, extract_phq9_score, parse_pdf, render_report_docx
+from report_cache import content_key
+from streaming import report_pdf, report_ranges
+from subtests import extract_subtests
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Seconds each stage may take, in the order they run
+DEFAULT_BUDGETS = {
+    "report_ranges": 120,
+    "report_pdf": 30,
+    "page_index": 30,
+    "extract_text": 30,
+    "extract_subtests": 10,
+    "extract_gad7_phq9": 10,
+    "extract_tables": 120,
+    "render_docx": 30,
+}
+
+# Seconds a fresh child may take to import and warm up before its first stage
+START_TIMEOUT_S = 120
+
+# ``kind`` is "timeout", "cpu_limit", "crashed" (the child died), "error" (the
+# stage raised) or "skipped" (a stage it needs failed)
+StageError = namedtuple("StageError", ["stage", "kind", "message", "elapsed_s"])
+
+
+class StageFailed(Exception):
+    def __init__(self, error):
+        super().__init__(error.message)
+        self.error = error
+
+
+# Stage functions run in the child and record into its PipelineMetrics
+def _report_ranges(metrics, pdf_path):
+    with stage(metrics, "report_ranges"):
+        return report_ranges(pdf_path)
+
+
+def _report_pdf(metrics, pdf_path, first, end):
+    with stage(metrics, "report_pdf", pages=end - first):
+        return report_pdf(pdf_path, first, end)
+
+
+def _page_index(metrics, pdf_bytes):
+    with stage(metrics, "page_index"):
+        page_index = build_page_index(BytesIO(pdf_bytes), keep_texts=True)
+    if page_index is not None and metrics is not None:
+        metrics.add_pages("page_index", page_index.page_count)
+    return page_index
+
+
+def _extract_text(metrics, pdf_bytes, page_index):
+    report = parse_pdf(BytesIO(pdf_bytes), targeted=page_index is not None, metrics=metrics, tables=False,
+                       page_index=page_index)
+    return report.text
+
+
+def _extract_subtests(metrics, text):
+    with stage(metrics, "extract_subtests"):
+        return extract_subtests(text)
+
+
+def _extract_tables(metrics, pdf_bytes, page_index):
+    report = parse_pdf(BytesIO(pdf_bytes), targeted=page_index is not None, metrics=metrics, text=False,
+                       page_index=page_index)
+    return report.tables
+
+
+def _extract_gad7_phq9(metrics, text):
+    report = ParsedReport([text], [])
+    with stage(metrics, "extract_gad7_phq9"):
+        return extract_gad7_raw(report), extract_phq9_score(report)
+
+
+def _render_docx(metrics, entry):
+    with stage(metrics, "render_docx"):
+        docx_bio = render_report_docx(entry)
+    return docx_bio.getvalue() if docx_bio is not None else None
+
+
+STAGE_FUNCTIONS = {
+    "report_ranges": _report_ranges,
+    "report_pdf": _report_pdf,
+    "page_index": _page_index,
+    "extract_text": _extract_text,
+    "extract_subtests": _extract_subtests,
+    "extract_gad7_phq9": _extract_gad7_phq9,
+    "extract_tables": _extract_tables,
+    "render_docx": _render_docx,
+}
+
+
+# Let the child use ``seconds`` more CPU time before the kernel stops it
+# (SIGXCPU); None lifts the limit again
+def _limit_cpu(seconds):
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds is None:
+        soft = hard
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+# Child process loop: run one stage per message until the pipe closes; each
+# reply carries the stage's own PipelineMetrics
+def _serve(conn):
+    from warmup import warm_up
+
+    warm_up()
+    start_tracing()
+    conn.send(("ready", None))
+    while True:
+        try:
+            name, budget, args = conn.recv()
+        except EOFError:
+            return
+        _limit_cpu(budget)
+        metrics = PipelineMetrics(name)
+        try:
+            value = STAGE_FUNCTIONS[name](metrics, *args)
+            conn.send(("ok", value, metrics))
+        except Exception as exc:
+            conn.send(("error", f"{type(exc).__name__}: {exc}", metrics))
+        finally:
+            _limit_cpu(None)
+
+
+class StageRunner:
+    """One child process that runs stages under budgets, replaced when killed.
+
+    ``budgets`` overrides entries of ``DEFAULT_BUDGETS``. A runner is used by
+    one thread at a time; ``get_runner`` keeps one per thread.
+    """
+
+    def __init__(self, budgets=None):
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self._process = None
+        self._conn = None
+
+    def start(self):
+        """Start the child, if it is not running, and wait until it is warm."""
+        if self._process is not None and self._process.is_alive():
+            return
+        self.close()
+        # spawn keeps the child clear of the parent's threads and pdfium state
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn,), name="cnsvs-stages", daemon=True)
+        self._process.start()
+        child_conn.close()
+        if not self._conn.poll(START_TIMEOUT_S):
+            self.close()
+            raise RuntimeError(f"the stage worker did not start within {START_TIMEOUT_S}s")
+        self._conn.recv()
+
+    def close(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def call(self, name, *args, metrics=None):
+        """Result of stage ``name``; raises StageFailed with a StageError when it fails.
+
+        The child's measurements of the stage are merged into ``metrics``.
+        """
+        budget = self.budgets[name]
+        self.start()
+        started = time.perf_counter()
+        self._conn.send((name, budget, args))
+        try:
+            ready = self._conn.poll(budget)
+            status, value, child_metrics = self._conn.recv() if ready else (None, None, None)
+        except EOFError:
+            status, value, child_metrics = None, None, None
+        elapsed = time.perf_counter() - started
+        if metrics is not None:
+            if child_metrics is not None:
+                metrics.merge(child_metrics)
+            else:
+                metrics.add_stage(name, elapsed)
+
+        if status == "ok":
+            return value
+        if status == "error":
+            raise StageFailed(StageError(name, "error", value, elapsed))
+        exitcode = self._process.exitcode
+        self.close()
+        if exitcode is None:
+            error = StageError(name, "timeout", f"stopped after {budget}s", elapsed)
+        elif exitcode == -getattr(signal, "SIGXCPU", 0):
+            error = StageError(name, "cpu_limit", f"used more than {budget}s of CPU time", elapsed)
+        else:
+            error = StageError(name, "crashed", f"the stage worker exited with code {exitcode}", elapsed)
+        raise StageFailed(error)
+
+
+_local = threading.local()
+
+
+def get_runner():
+    """This thread's StageRunner, created on first use."""
+    runner = getattr(_local, "runner", None)
+    if runner is None:
+        runner = _local.runner = StageRunner()
+    return runner
+
+
+# Job queue worker initializer: have the stage child running before the first
+# job, and trace this worker's own allocations when asked to
+def start_runner():
+    start_tracing()
+    get_runner().start()
+
+
+def guarded_entry(pdf_bytes, render_docx=True, metrics=None, runner=None):
+    """The ``extract_entry`` result for a PDF, built stage by stage in the child.
+
+    Failed stages leave their fields empty (no tables, no subtests, None for
+    the questionnaires and the DOCX) and are listed in ``entry["errors"]``.
+    With ``render_docx`` the entry carries ``docx`` bytes, as from
+    ``pipeline.prepare_report``.
+    """
+    runner = runner if runner is not None else get_runner()
+    results = {}
+    errors = []
+
+    def run(name, *args, needs=()):
+        failed = [need for need in needs if need not in results]
+        if failed:
+            errors.append(StageError(name, "skipped", f"needs {', '.join(failed)}", 0.0))
+            return
+        try:
+            results[name] = runner.call(name, *args, metrics=metrics)
+        except StageFailed as exc:
+            errors.append(exc.error)
+
+    # Without an index (none found, or the stage failed) every page is parsed
+    run("page_index", pdf_bytes)
+    page_index = results.get("page_index")
+    run("extract_text", pdf_bytes, page_index)
+    text = results.get("extract_text")
+    run("extract_subtests", text, needs=["extract_text"])
+    run("extract_gad7_phq9", text, needs=["extract_text"])
+    run("extract_tables", pdf_bytes, page_index)
+
+    gad7_raw, phq9_score = results.get("extract_gad7_phq9", (None, None))
+    entry = derive_entry({
+        "tables": results.get("extract_tables", []),
+        "subtest_percentiles": results.get("extract_subtests", {}),
+        "gad7_raw": gad7_raw,
+        "phq9_score": phq9_score,
+        "errors": errors,
+    })
+    # Set before rendering: the DOCX leaves out what a failed stage never read
+    entry["errors"] = errors
+    if render_docx:
+        run("render_docx", entry)
+        entry["docx"] = results.get("render_docx")
+    if metrics is not None and errors:
+        metrics.count("stage_errors", len(errors))
+    return entry
+
+
+# Job body for the app's background queue: prepare_report with every stage
+# guarded; the entry always comes back, with any stage errors in it
+def prepare_guarded_report(pdf_bytes, name=None):
+    metrics = PipelineMetrics(name)
+    with stage(metrics, "cache_lookup"):
+        key = content_key(pdf_bytes)
+    return key, guarded_entry(pdf_bytes, metrics=metrics), metrics
+
@@ -0,0 +1,237 @@
+"""Per-stage timing and memory instrumentation for the extraction pipeline.
+
+A ``PipelineMetrics`` is created per upload and handed to the pipeline
+functions through their ``metrics`` argument. Every stage records wall time,
+CPU time of the calling thread, pages touched, and how much memory grew while
+it ran: resident memory at its end less at its start (Linux), and, when
+tracemalloc is running, the peak of traced Python allocations above where
+they stood at its start. Tracing is per process, so ``start_tracing`` is
+called in every process that runs stages (the app, its job workers and their
+stage children) and starts it when ``CNSVS_TRACE_MEMORY=1``. Passing
+``metrics=None`` turns all of this into a no-op.
+
+Finished uploads are added to the process-wide ``REGISTRY``. It renders
+Prometheus text exposition for ``start_metrics_server``, and every upload is
+also logged as one JSON line on the ``cnsvs.metrics`` logger.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("cnsvs.metrics")
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _rss_peak_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+# Current resident memory; None where /proc is not available
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def start_tracing():
+    """Trace Python allocations in this process when ``CNSVS_TRACE_MEMORY=1``."""
+    if os.environ.get("CNSVS_TRACE_MEMORY") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class PipelineMetrics:
+    """Stage measurements for one upload; repeated stages accumulate."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name, pages=0):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            py_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_start = _rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            rss_end = _rss_mb()
+            rss_growth = rss_end - rss_start if rss_start is not None and rss_end is not None else None
+            py_growth = (tracemalloc.get_traced_memory()[1] - py_start) / (1024 * 1024) if tracing else None
+            self.add_stage(name, wall, cpu, pages, rss_growth_mb=rss_growth, py_growth_mb=py_growth)
+
+    # Record a stage measured elsewhere, e.g. one killed before it could report;
+    # a repeated stage keeps its largest memory growth
+    def add_stage(self, name, wall_s, cpu_s=0.0, pages=0, calls=1, rss_growth_mb=None, py_growth_mb=None):
+        stats = self.stages.setdefault(name, {
+            "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "pages": 0,
+            "rss_growth_mb": None, "py_growth_mb": None,
+        })
+        stats["calls"] += calls
+        stats["wall_s"] += wall_s
+        stats["cpu_s"] += cpu_s
+        stats["pages"] += pages
+        if rss_growth_mb is not None:
+            stats["rss_growth_mb"] = max(stats["rss_growth_mb"] or 0.0, rss_growth_mb)
+        if py_growth_mb is not None:
+            stats["py_growth_mb"] = max(stats["py_growth_mb"] or 0.0, py_growth_mb)
+
+    # Fold in the measurements of another run, e.g. stages run in a child process
+    def merge(self, other):
+        for name, stats in other.stages.items():
+            self.add_stage(name, stats["wall_s"], stats["cpu_s"], stats["pages"], stats["calls"],
+                           stats["rss_growth_mb"], stats["py_growth_mb"])
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    # Pages a stage covered, when only known once it has finished
+    def add_pages(self, name, pages):
+        if name in self.stages:
+            self.stages[name]["pages"] += pages
+
+    # Count events such as cache hits alongside the stage timings
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total_wall_s(self):
+        return sum(stats["wall_s"] for stats in self.stages.values())
+
+    def to_dict(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            stage = {key: round(value, 6) if isinstance(value, float) else value
+                     for key, value in stats.items()}
+            if stats["pages"]:
+                stage["ms_per_page"] = round(stats["wall_s"] * 1000 / stats["pages"], 3)
+            stages[name] = stage
+        return {
+            "name": self.name,
+            "total_wall_s": round(self.total_wall_s, 6),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+
+# Context manager for a stage that does nothing when no metrics are collected
+def stage(metrics, name, pages=0):
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name, pages)
+
+
+class MetricsRegistry:
+    """Process-wide totals of every recorded upload, in Prometheus form."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._uploads = 0
+
+    def record(self, metrics):
+        with self._lock:
+            self._uploads += 1
+            for name, stats in metrics.stages.items():
+                totals = self._stages.setdefault(name, {
+                    "uploads": 0, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "pages": 0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                })
+                totals["uploads"] += 1
+                totals["calls"] += stats["calls"]
+                totals["wall_s"] += stats["wall_s"]
+                totals["cpu_s"] += stats["cpu_s"]
+                totals["pages"] += stats["pages"]
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if stats["wall_s"] <= bound:
+                        totals["buckets"][i] += 1
+            for name, value in metrics.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+        logger.info(json.dumps(metrics.to_dict(), sort_keys=True))
+
+    def render_prometheus(self):
+        with self._lock:
+            lines = [
+                "# HELP cnsvs_uploads_total Uploads processed.",
+                "# TYPE cnsvs_uploads_total counter",
+                f"cnsvs_uploads_total {self._uploads}",
+                "# HELP cnsvs_stage_seconds Wall time per pipeline stage and upload.",
+                "# TYPE cnsvs_stage_seconds histogram",
+            ]
+            for name, totals in sorted(self._stages.items()):
+                for bound, count in zip(LATENCY_BUCKETS, totals["buckets"]):
+                    lines.append(f'cnsvs_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'cnsvs_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {totals["uploads"]}')
+                lines.append(f'cnsvs_stage_seconds_sum{{stage="{name}"}} {totals["wall_s"]:.6f}')
+                lines.append(f'cnsvs_stage_seconds_count{{stage="{name}"}} {totals["uploads"]}')
+            for metric, key, help_text in (
+                ("cnsvs_stage_cpu_seconds_total", "cpu_s", "CPU time per pipeline stage."),
+                ("cnsvs_stage_calls_total", "calls", "Times each pipeline stage ran."),
+                ("cnsvs_stage_pages_total", "pages", "PDF pages processed per pipeline stage."),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, totals in sorted(self._stages.items()):
+                    value = totals[key]
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{metric}{{stage="{name}"}} {value}')
+            lines.append("# HELP cnsvs_events_total Pipeline events such as cache hits.")
+            lines.append("# TYPE cnsvs_events_total counter")
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'cnsvs_events_total{{event="{name}"}} {value}')
+            rss = _rss_peak_mb()
+            if rss is not None:
+                lines.append("# HELP cnsvs_process_peak_rss_megabytes Peak resident memory of this process.")
+                lines.append("# TYPE cnsvs_process_peak_rss_megabytes gauge")
+                lines.append(f"cnsvs_process_peak_rss_megabytes {rss:.1f}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve ``registry`` as Prometheus text on http://host:port/metrics in a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="cnsvs-metrics", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,300 @@
+"""Local background job queue, so uploads do not block the Streamlit script.
+
+A ``JobQueue`` runs submitted functions on a worker pool. The pool is
+processes by default, because extraction is CPU-bound. Callers keep the job id
+and poll ``get``. There is no broker: the queue is an in-memory deque in the
+server process, and the app shares one queue across sessions through
+``st.cache_resource``.
+
+Jobs start in submission order, with two limits:
+
+- no more than ``max_workers`` run at once, so the pool never holds a backlog
+  of its own that could not be cancelled;
+- each owner (a browser session in the app) has at most ``per_user_limit``
+  jobs running while another owner has jobs waiting. One user's large batch
+  then cannot starve everyone else, but a user alone on the server gets
+  every worker. Jobs already started over the limit are not stopped; others
+  get the workers as those jobs finish.
+
+Callers ``pop`` a finished job once they have its result, so its output (DOCX
+bytes, say) is not kept any longer than needed. Jobs nobody collects are
+forgotten ``keep_s`` after they finish.
+
+A queued job can always be cancelled. A running job is marked ``CANCELLING``
+and its result thrown away, but a pool worker cannot be interrupted, so the
+job becomes ``CANCELLED`` and its slot frees up only when the function
+returns.
+
+``initializer`` runs once in every worker as it starts (the app passes
+``guard.start_runner``), and ``warm`` starts all the workers ahead of the first
+job.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# Cancelled while running; still holds its worker until the function returns
+CANCELLING = "cancelling"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised by ``JobQueue.submit`` when ``max_pending`` jobs are already waiting."""
+
+
+class Job:
+    """One submitted call and its outcome; ``result`` is set once status is DONE."""
+
+    def __init__(self, owner, name, fn, args):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    # Seconds spent waiting in the queue, so far or in total
+    @property
+    def wait_s(self):
+        end = self.started_at or self.finished_at or time.time()
+        return end - self.submitted_at
+
+    # Seconds spent running, so far or in total; None if it never started
+    @property
+    def run_s(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percent / 100 * len(ordered)))]
+
+
+# Submitted by JobQueue.warm; it only has to make the pool start a worker
+def _started():
+    return os.getpid()
+
+
+class JobQueue:
+    """FIFO job queue over a local worker pool with per-owner concurrency limits."""
+
+    def __init__(self, max_workers=None, per_user_limit=None, max_pending=1000, processes=True,
+                 keep_s=3600, initializer=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.per_user_limit = per_user_limit or max(1, self.max_workers // 2)
+        self.max_pending = max_pending
+        self.processes = processes
+        self.keep_s = keep_s
+        self.initializer = initializer
+        self._lock = threading.RLock()
+        self._pool = None
+        self._jobs = {}
+        self._pending = deque()
+        self._running = Counter()
+        # (wait_s, run_s) of recently finished jobs, for the latency view
+        self._latencies = deque(maxlen=500)
+        self._finished = Counter()
+        self._closed = False
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.processes:
+                # spawn keeps workers clear of the Streamlit server's threads and state
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                 initializer=self.initializer)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cnsvs-job",
+                                                initializer=self.initializer)
+        return self._pool
+
+    def warm(self):
+        """Start every worker now, so none is still starting up when jobs arrive.
+
+        Returns without waiting. The pool starts a worker for each task it is
+        handed while the others are busy, so one trivial task per worker is
+        enough.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            pool = self._get_pool()
+            for _ in range(self.max_workers):
+                pool.submit(_started)
+
+    def submit(self, owner, name, fn, *args):
+        """Queue ``fn(*args)`` for ``owner``; returns the Job. ``fn`` and the args must pickle."""
+        job = Job(owner, name, fn, args)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("the job queue has been shut down")
+            self._prune()
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f"{len(self._pending)} jobs are already waiting")
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._dispatch()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """Remove a finished job and return it, once its result has been collected.
+
+        Returns None for an unknown job or one that has not finished yet; the
+        latter stays in the queue.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return None
+            return self._jobs.pop(job_id)
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    # 1-based place of a queued job in line, or None once it has started
+    def position(self, job_id):
+        with self._lock:
+            for place, job in enumerate(self._pending, start=1):
+                if job.id == job_id:
+                    return place
+        return None
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; False if it had already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if job.status == QUEUED:
+                self._pending.remove(job)
+                self._finish(job, CANCELLED)
+            else:
+                job.future.cancel()
+                job.status = CANCELLING
+            return True
+
+    def stats(self):
+        """Queue depth, running jobs and recent wait/run latencies."""
+        with self._lock:
+            waits = [wait for wait, _ in self._latencies]
+            runs = [run for _, run in self._latencies if run is not None]
+            return {
+                "queued": len(self._pending),
+                "running": sum(self._running.values()),
+                "workers": self.max_workers,
+                "per_user_limit": self.per_user_limit,
+                "owners_running": len(self._running),
+                "finished": dict(self._finished),
+                "oldest_wait_s": self._pending[0].wait_s if self._pending else 0.0,
+                "wait_p50_s": _percentile(waits, 50),
+                "wait_p95_s": _percentile(waits, 95),
+                "run_p50_s": _percentile(runs, 50),
+                "run_p95_s": _percentile(runs, 95),
+            }
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            self._closed = True
+            for job in list(self._pending):
+                self.cancel(job.id)
+            pool, self._pool = self._pool, None
+        # Outside the lock: the done callbacks of running jobs need it
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    # Start queued jobs, oldest first, while workers and owner limits allow
+    def _dispatch(self):
+        if self._closed:
+            return
+        for job in list(self._pending):
+            # A job that finished at once can dispatch others from its callback
+            if job.status != QUEUED:
+                continue
+            if sum(self._running.values()) >= self.max_workers:
+                break
+            if self._running[job.owner] >= self.per_user_limit and self._others_waiting(job.owner):
+                continue
+            self._pending.remove(job)
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._running[job.owner] += 1
+            try:
+                job.future = self._get_pool().submit(job.fn, *job.args)
+            except BrokenProcessPool:
+                # A worker died earlier; start a new pool for this and later jobs
+                self._discard_pool()
+                job.future = self._get_pool().submit(job.fn, *job.args)
+            job.future.add_done_callback(partial(self._on_done, job))
+
+    def _others_waiting(self, owner):
+        return any(job.owner != owner and job.status == QUEUED for job in self._pending)
+
+    def _discard_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _on_done(self, job, future):
+        with self._lock:
+            self._running[job.owner] -= 1
+            if not self._running[job.owner]:
+                del self._running[job.owner]
+            if job.status == CANCELLING:
+                self._finish(job, CANCELLED)
+            else:
+                try:
+                    job.result = future.result()
+                    self._finish(job, DONE)
+                except BrokenProcessPool as exc:
+                    self._discard_pool()
+                    job.error = f"{type(exc).__name__}: {exc}"
+                    self._finish(job, FAILED)
+                except Exception as exc:
+                    job.error = f"{type(exc).__name__}: {exc}"
+                    self._finish(job, FAILED)
+            self._dispatch()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        # The arguments (upload bytes) are not needed any more
+        job.args = None
+        self._finished[status] += 1
+        self._latencies.append((job.wait_s, job.run_s))
+
+    # Forget finished jobs nobody collected within keep_s
+    def _prune(self):
+        cutoff = time.time() - self.keep_s
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,138 @@
+"""Cheap first pass that maps the sections the pipeline reads to page numbers.
+
+pypdfium2 is already a pdfplumber dependency. It pulls the plain text of a
+page in native code about a hundred times faster than pdfplumber's layout
+analysis. That is enough to find which pages hold a subtest header, the
+GAD-7/PHQ-9 scores or the NPQ table, so ``pipeline.parse_pdf`` only lays out
+those pages. It also finds where each report starts in a file that holds
+several of them (see streaming.py). Built with ``keep_texts``, the index also
+keeps the raw text of the pages the extractors read, so the pdfium text
+engine (see text_engines.py) does not read the file a second time.
+"""
+import re
+import threading
+
+from subtests import SUBTEST_NAMES
+
+# Markers whose data the regex extractors read from the page text
+TEXT_MARKERS = SUBTEST_NAMES + ["GAD-7 Anxiety Severity", "PHQ-9 Score"]
+
+# Header row of the NPQ (Domain / Score / Severity) table
+TABLE_MARKERS = ["Domain Score Severity"]
+
+# Header of the domain-score table on the first page of every report; marks
+# where the next patient starts in an export of several concatenated reports
+REPORT_MARKERS = ["Domain Scores"]
+
+# PDFium is not thread-safe and Streamlit serves sessions from threads
+PDFIUM_LOCK = threading.Lock()
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text)
+
+
+def pdfium_texts(pdf_file, pages=None):
+    """Yield ``(page_number, text)`` from PDFium's text layer, for every page or those in ``pages``.
+
+    The text is as PDFium returns it, with ``\r\n`` line ends and runs of
+    spaces. ``PDFIUM_LOCK`` is held until the generator finishes or is closed.
+    """
+    import pypdfium2
+
+    try:
+        with PDFIUM_LOCK:
+            document = pypdfium2.PdfDocument(pdf_file)
+            try:
+                for page_number in range(len(document)):
+                    if pages is not None and page_number not in pages:
+                        continue
+                    page = document[page_number]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_range()
+                    textpage.close()
+                    page.close()
+                    yield page_number, text
+            finally:
+                document.close()
+    finally:
+        if hasattr(pdf_file, "seek"):
+            pdf_file.seek(0)
+
+
+class PageIndex:
+    """Pages on which each marker appears, plus what the pipeline must parse.
+
+    ``page_texts`` maps each of ``text_pages`` to its raw ``pdfium_texts``
+    text when the index was built with ``keep_texts``; otherwise it is None.
+    """
+
+    def __init__(self, page_count, marker_pages, page_texts=None):
+        self.page_count = page_count
+        self.marker_pages = marker_pages
+        self.page_texts = page_texts
+
+    def _pages(self, markers):
+        pages = set()
+        for marker in markers:
+            pages.update(self.marker_pages.get(marker, []))
+        return pages
+
+    # Pages whose text is needed: every marker page and the page after it,
+    # since a subtest's rows can run over onto the next page
+    @property
+    def text_pages(self):
+        pages = set()
+        for page_number in self._pages(TEXT_MARKERS):
+            pages.add(page_number)
+            if page_number + 1 < self.page_count:
+                pages.add(page_number + 1)
+        return pages
+
+    @property
+    def table_pages(self):
+        return self._pages(TABLE_MARKERS)
+
+    # (first, end) page ranges of the reports in the file; pages before the
+    # first marker belong to the first report
+    def report_ranges(self):
+        starts = sorted(self._pages(REPORT_MARKERS))
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        return list(zip(starts, starts[1:] + [self.page_count]))
+
+
+def build_page_index(pdf_file, keep_texts=False):
+    """Index ``pdf_file`` (path, bytes or binary file object) by marker.
+
+    Returns None when pypdfium2 is unavailable, cannot read the file, or finds
+    none of the markers (e.g. a scanned report). Callers then parse every page.
+    With ``keep_texts`` the index keeps the raw text of its ``text_pages``.
+    """
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return None
+
+    markers = [(marker, _normalize(marker)) for marker in TEXT_MARKERS + TABLE_MARKERS + REPORT_MARKERS]
+    marker_pages = {}
+    raw_texts = []
+    page_count = 0
+    try:
+        for page_number, raw_text in pdfium_texts(pdf_file):
+            text = _normalize(raw_text)
+            for marker, normalized in markers:
+                if normalized in text:
+                    marker_pages.setdefault(marker, []).append(page_number)
+            if keep_texts:
+                raw_texts.append(raw_text)
+            page_count += 1
+    except Exception:
+        return None
+
+    if not any(marker in marker_pages for marker in TEXT_MARKERS + TABLE_MARKERS):
+        return None
+    page_index = PageIndex(page_count, marker_pages)
+    if keep_texts:
+        page_index.page_texts = {page_number: raw_texts[page_number] for page_number in page_index.text_pages}
+    return page_index
@@ -0,0 +1,713 @@
+import pandas as pd
+import os
+import re
+from io import BytesIO
+from grading import RULES_VERSION, grade_domain_scores, grade_npq_scores
+from instrumentation import PipelineMetrics, stage
+from page_index import build_page_index
+from render import DEFAULT_TEMPLATE, FLAG_GRADES, ReportLine, ReportModel, TestSection, score_lines, test_sections_from_strings
+from report_cache import content_key
+from subtests import extract_subtests, map_values
+from text_engines import get_text_engine
+
+# Compiled once at import; the extractors run for every report
+NUMBER = re.compile(r'\d+')
+GAD7_PATTERN = re.compile(r'GAD-7 Anxiety Severity\s+(\d+)\s*\n', re.DOTALL)
+PHQ9_PATTERN = re.compile(r"PHQ-9 Score (\d+)")
+
+# What the extractors read out of a PDF. Everything else in an entry (grades,
+# flags, the GAD-7 line, the DOCX) is derived from these by derive_entry and
+# can be rebuilt without the PDF when the rules or a clinician's edits change
+RAW_FIELDS = ["tables", "subtest_percentiles", "gad7_raw", "phq9_score"]
+
+
+class ParsedReport:
+    """Per-page text and tables of a PDF, laid out by pdfplumber exactly once."""
+
+    def __init__(self, page_texts, page_tables, page_index=None):
+        self.page_texts = page_texts
+        self.page_tables = page_tables
+        # Set when only the pages the index points at were laid out
+        self.page_index = page_index
+
+    @property
+    def text(self):
+        # Same concatenation the extractors used to build page by page
+        return "".join(self.page_texts)
+
+    @property
+    def tables(self):
+        return [table for page_tables in self.page_tables for table in page_tables]
+
+
+def parse_pdf(pdf_file, targeted=True, metrics=None, text_engine=None, text=True, tables=True, page_index=None):
+    """Open the PDF once and collect text and tables in a single pass over the pages.
+
+    With ``targeted`` set, a cheap page index (see page_index.py) picks the
+    pages that hold the data the extractors read, and pdfplumber only lays
+    out those. Skipped pages get empty text and no tables. Without an index,
+    every page is parsed. ``text_engine`` names the engine for the page text
+    (see text_engines.py; default "auto"). With anything but pdfplumber,
+    pdfplumber lays out a page only for its tables. ``text`` or ``tables``
+    set to false leaves that part out (empty text, no tables), so the two
+    can run as separate stages. A ``page_index`` already built for the file
+    is used instead of building another one. Stage timings go to ``metrics``
+    when given.
+    """
+    # Imported here so that loading the module (for the text extractors, or in
+    # a worker that is still starting) does not pay for pdfminer
+    import pdfplumber
+
+    engine = get_text_engine(text_engine)
+    if page_index is None and targeted:
+        # The raw page text is kept for the text engine, so it need not read
+        # the file again
+        with stage(metrics, "page_index"):
+            page_index = build_page_index(pdf_file, keep_texts=text and engine.name != "pdfplumber")
+        if page_index is not None and metrics is not None:
+            metrics.add_pages("page_index", page_index.page_count)
+    if page_index is not None:
+        text_pages = page_index.text_pages
+        table_pages = page_index.table_pages
+
+    engine_texts = None
+    if text and engine.name != "pdfplumber":
+        try:
+            with stage(metrics, "extract_text"):
+                engine_texts = engine.page_texts(pdf_file, text_pages if page_index is not None else None, page_index)
+        except Exception:
+            # Fall back to pdfplumber's own text for this file
+            engine_texts = None
+        if metrics is not None and engine_texts is not None:
+            metrics.add_pages("extract_text", len(engine_texts))
+        if engine_texts is not None and not tables:
+            # Nothing left for pdfplumber to do
+            page_count = page_index.page_count if page_index is not None else len(engine_texts)
+            page_texts = [engine_texts.get(page_number, "") for page_number in range(page_count)]
+            return ParsedReport(page_texts, [[] for _ in page_texts], page_index)
+
+    page_texts = []
+    page_tables = []
+    table_count = 0
+    with pdfplumber.open(pdf_file) as pdf:
+        with stage(metrics, "pdf_open"):
+            pages = pdf.pages
+        for page_number, page in enumerate(pages):
+            # The upper table is the second table in the PDF, so tables are
+            # read from every page until two have been seen
+            page_text, tables_found = parse_page(
+                page,
+                text=text and engine_texts is None and (page_index is None or page_number in text_pages),
+                tables=tables and (page_index is None or table_count < 2 or page_number in table_pages),
+                metrics=metrics,
+            )
+            if engine_texts is not None:
+                page_text = engine_texts.get(page_number, "")
+            table_count += len(tables_found)
+            page_texts.append(page_text)
+            page_tables.append(tables_found)
+    return ParsedReport(page_texts, page_tables, page_index)
+
+
+# Text and tables of one pdfplumber page; parts not asked for come back empty
+def parse_page(page, text=True, tables=True, metrics=None):
+    page_text = ""
+    page_tables = []
+    if text:
+        with stage(metrics, "extract_text", pages=1):
+            # None for a page without any characters
+            page_text = page.extract_text() or ""
+    if tables:
+        with stage(metrics, "extract_tables", pages=1):
+            page_tables = page.extract_tables()
+    return page_text, page_tables
+
+
+# Accept either an already parsed report or anything pdfplumber can open
+def ensure_parsed(report):
+    if isinstance(report, ParsedReport):
+        return report
+    return parse_pdf(report)
+
+
+# Run the extractors on an upload, or return the cached result for the same bytes
+def extract_report_data(pdf_bytes, cache=None, metrics=None):
+    with stage(metrics, "cache_lookup"):
+        key = content_key(pdf_bytes)
+        entry = cache.get(key) if cache is not None else None
+    if metrics is not None and cache is not None:
+        metrics.count("cache_hit" if entry is not None else "cache_miss")
+    if entry is None:
+        entry = extract_entry(parse_pdf(BytesIO(pdf_bytes), metrics=metrics), metrics)
+        if cache is not None:
+            cache.put(key, entry)
+    elif needs_regrade(entry):
+        # Graded under older rules: re-derive from the raw values, no re-parse
+        with stage(metrics, "regrade"):
+            entry = regrade_entry(entry)
+        if cache is not None:
+            cache.put(key, entry)
+    return key, entry
+
+
+# Run the extractors on a parsed report; the result is what the cache stores
+def extract_entry(report, metrics=None):
+    return derive_entry(extract_raw(report, metrics))
+
+
+# The RAW_FIELDS of a parsed report
+def extract_raw(report, metrics=None):
+    with stage(metrics, "extract_subtests"):
+        subtest_percentiles = extract_subtests(report.text)
+    with stage(metrics, "extract_gad7_phq9"):
+        gad7_raw = extract_gad7_raw(report)
+        phq9_score = extract_phq9_score(report)
+    return {
+        "tables": report.tables,
+        "subtest_percentiles": subtest_percentiles,
+        "gad7_raw": gad7_raw,
+        "phq9_score": phq9_score,
+    }
+
+
+def derive_entry(raw, edits=None):
+    """A full entry from the raw values: subtest flags and the GAD-7 line.
+
+    ``edits`` holds a clinician's changes and is kept in the entry:
+    ``{"grades": {section: {item: grade}}, "notes": [text, ...]}``. A section
+    is "Domain Scores", "NPQ" or a subtest name; the items are the domain
+    names and metric labels as shown in the report. Grades not offered for
+    the section (``grade_choices``) are ignored. Grouped subtest metrics
+    cannot be overridden. The table grades are derived when they are read
+    (``graded_tables``), so only the subtest flags are stored here. When
+    ``raw`` carries the errors of a guarded run in which the GAD-7/PHQ-9
+    stage failed, the GAD-7 line stays None rather than "not found".
+    """
+    test_data = map_values(raw["subtest_percentiles"], apply_flagging)
+    for test_name in ((edits or {}).get("grades") or {}):
+        for metric, grade in section_overrides(edits, test_name).items():
+            value = raw["subtest_percentiles"].get(test_name, {}).get(metric)
+            if value is not None and not isinstance(value, list):
+                test_data[test_name][metric] = f"{int(value)}, {grade}" + (" | FLAG" if grade in FLAG_GRADES else "")
+    entry = {field: raw[field] for field in RAW_FIELDS}
+    entry.update(
+        test_data=test_data,
+        gad7_score=None if questionnaires_failed(raw) else gad7_line(raw["gad7_raw"]),
+        rules_version=RULES_VERSION,
+    )
+    if edits:
+        entry["edits"] = edits
+    return entry
+
+
+# Grades a clinician may set in ``edits``: a percentile band for domain scores
+# and subtests, a flag or no flag (None) for NPQ rows
+BAND_GRADES = ["Above Average", "Average", "Low Average", "Low", "Very Low"]
+NPQ_GRADES = ["FLAG", None]
+
+
+def grade_choices(section):
+    return NPQ_GRADES if section == "NPQ" else BAND_GRADES
+
+
+# The grade overrides of one section; grades not offered for it are ignored
+def section_overrides(edits, section):
+    overrides = ((edits or {}).get("grades") or {}).get(section) or {}
+    return {label: grade for label, grade in overrides.items() if grade in grade_choices(section)}
+
+
+# True when the guarded GAD-7/PHQ-9 stage failed or was skipped (guard.py):
+# the scores were never looked for, so they must not read "not found"
+def questionnaires_failed(entry):
+    return any(error.stage == "extract_gad7_phq9" for error in entry.get("errors") or ())
+
+
+# The PHQ-9 line of an entry; None when the questionnaires were not read
+def phq9_line(entry):
+    return None if questionnaires_failed(entry) else interpret_phq9_score(entry["phq9_score"])
+
+
+# (gad7_score, gad7_severity, phq9_score, phq9_severity) of an entry as typed
+# values; None for a total that was not found or not read and for a severity
+# that cannot be read
+def questionnaire_scores(entry):
+    if questionnaires_failed(entry):
+        return None, None, None, None
+    gad7_raw = entry["gad7_raw"]
+    phq9_score = entry["phq9_score"]
+    gad7_score = int(gad7_raw) if gad7_raw is not None else None
+    return (
+        gad7_score,
+        classify_gad7_score(gad7_score) if gad7_score is not None else None,
+        phq9_score,
+        classify_phq9_score(phq9_score) if phq9_score is not None else None,
+    )
+
+
+# True when an entry was graded under other rules than the current RULES_VERSION
+def needs_regrade(entry):
+    return entry.get("rules_version") != RULES_VERSION
+
+
+def regrade_entry(entry, edits=None, render_docx=False):
+    """Re-derive an entry's grades and flags from its raw values, with no PDF.
+
+    ``edits`` replaces the entry's edits (``derive_entry``); by default they
+    are kept. The old DOCX is dropped, and rebuilt here with ``render_docx``
+    or by whoever needs it next.
+    """
+    if edits is None:
+        edits = entry.get("edits")
+    new_entry = derive_entry(entry, edits)
+    if "errors" in entry:
+        new_entry["errors"] = entry["errors"]
+    if render_docx:
+        docx_bio = render_report_docx(new_entry)
+        new_entry["docx"] = docx_bio.getvalue() if docx_bio is not None else None
+    return new_entry
+
+def clean_percentile(value):
+    match = NUMBER.search(str(value))
+    return int(match.group(0)) if match else None
+
+def grading_system(percentile):
+    if percentile > 74:
+        return "Above Average"
+    elif 25 <= percentile <= 74:
+        return "Average"
+    elif 9 <= percentile <= 24:
+        return "Low Average"
+    elif 2 <= percentile <= 8:
+        return "Low"
+    else:
+        return "Very Low"
+
+def clean_score(value):
+    match = NUMBER.search(str(value))
+    return int(match.group(0)) if match else None
+
+def grading_system_2(severity):
+    if severity in ["Mild", "Moderate", "Severe"]:
+        return "FLAG"
+    else:
+        return None
+
+# Build the raw upper (domain) table and its graded percentile view, if present
+def process_upper_table(tables):
+    if len(tables) < 2:
+        return None, None
+
+    # The upper table is the second table in the PDF
+    table_data_1 = tables[1]
+    cleaned_columns_1 = []
+    for i, column_name in enumerate(table_data_1[0]):
+        if column_name is None:
+            cleaned_columns_1.append(f"Unnamed_{i}")
+        elif table_data_1[0].count(column_name) > 1:
+            cleaned_columns_1.append(f"{column_name}_{i}")
+        else:
+            cleaned_columns_1.append(column_name)
+
+    df1 = pd.DataFrame(table_data_1[1:], columns=cleaned_columns_1)
+
+    selected_columns_1 = df1.iloc[:, [0, 3]].copy()
+    selected_columns_1.columns = ["Domain Scores", "Percentile"]
+    return df1, grade_domain_scores(selected_columns_1)
+
+
+# Find the lower table by its known Domain / Score / Severity headers
+def find_lower_table(tables):
+    for table in tables:
+        if len(table) > 0 and len(table[0]) >= 3 and table[0][0] == "Domain" and table[0][1] == "Score" and table[0][2] == "Severity":
+            return table
+    return None
+
+
+# Build the raw lower (NPQ) table and its graded copy, if present
+def process_lower_table(tables):
+    lower_table_data = find_lower_table(tables)
+    if not lower_table_data:
+        return None, None
+
+    # Handle rows with extra columns
+    cleaned_lower_table_data = [row[:3] for row in lower_table_data[1:] if len(row) >= 3]
+    df2 = pd.DataFrame(cleaned_lower_table_data, columns=["Domain", "Score", "Severity"])
+
+    return df2, grade_npq_scores(df2)
+
+
+# Combine the graded upper and lower tables, whichever are available
+def combine_tables(upper_df, lower_df):
+    if upper_df is not None and lower_df is not None:
+        return pd.concat([upper_df, lower_df], axis=0, ignore_index=True)
+    elif upper_df is not None:
+        return upper_df
+    elif lower_df is not None:
+        return lower_df
+    return pd.DataFrame()
+
+
+# Clinician grade overrides for one section (see derive_entry) on a graded table
+def override_grades(df, section, edits):
+    overrides = section_overrides(edits, section)
+    if df is None or not overrides:
+        return df
+    label = df[df.columns[0]]
+    df = df.copy()
+    hit = label.isin(list(overrides))
+    df.loc[hit, "Grade"] = label[hit].map(overrides)
+    return df
+
+
+# Graded upper and lower tables of an entry, with its grade overrides applied
+def graded_tables(entry):
+    tables = entry["tables"]
+    edits = entry.get("edits")
+    _, upper_df = process_upper_table(tables)
+    lower_df = None
+    if entry["test_data"] is not None:
+        _, lower_df = process_lower_table(tables)
+    return override_grades(upper_df, "Domain Scores", edits), override_grades(lower_df, "NPQ", edits)
+
+
+# Typed render model of an extracted report; None when there is nothing to render
+def build_report_model(entry):
+    return _report_model(entry, *graded_tables(entry))
+
+
+def _report_model(entry, upper_df, lower_df):
+    test_data = entry["test_data"]
+    combined_df = combine_tables(upper_df, lower_df)
+    if combined_df.empty and test_data is None:
+        return None
+    lines, npq_heading_before = score_lines(combined_df)
+    phq9_interpretation = phq9_line(entry)
+    edits = entry.get("edits") or {}
+    tests = test_sections(entry["subtest_percentiles"], edits)
+    return ReportModel(lines, npq_heading_before, tests, entry["gad7_score"], phq9_interpretation,
+                       list(edits.get("notes") or []))
+
+
+# Build the DOCX for an extracted report without any UI; None when there is nothing to render
+def render_report_docx(entry, template=DEFAULT_TEMPLATE):
+    model = build_report_model(entry)
+    if model is None:
+        return None
+    return BytesIO(template.render(model))
+
+
+# Several extracted reports in one DOCX, one report per page; None when none has data
+def render_combined_docx(entries, template=DEFAULT_TEMPLATE):
+    models = [model for model in map(build_report_model, entries) if model is not None]
+    if not models:
+        return None
+    return BytesIO(template.render(models))
+
+
+# Missing cells come back from pandas as NaN; JSON and CSV want None
+def _plain(value):
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def summarize_report(entry):
+    """JSON-serialisable view of an extracted report, as typed values.
+
+    ``domain_scores``, ``npq`` and ``subtests`` are lists of rows, each with
+    its number (``percentile`` or ``score``), its ``grade`` after any
+    clinician edits and whether it is ``flagged``. NPQ rows also carry the
+    ``severity`` from the PDF, and a subtest row its ``test``, ``metric`` and
+    ``part`` (the label within a grouped metric, else None). The GAD-7 and
+    PHQ-9 totals are ``gad7_score``/``gad7_severity`` and
+    ``phq9_score``/``phq9_severity``; ``notes`` are the clinician's.
+    """
+    return _summary(entry, *graded_tables(entry))
+
+
+def _summary(entry, upper_df, lower_df):
+    domain_scores = []
+    if upper_df is not None:
+        domain_scores = [_domain_score(*row[:3]) for row in upper_df.itertuples(index=False)]
+    npq = []
+    if lower_df is not None:
+        npq = [_npq_score(*row[:4]) for row in lower_df.itertuples(index=False)]
+    return _summary_of(entry, domain_scores, npq)
+
+
+# Summary rows and the summary itself, shared with the bulk summarize_reports
+def _domain_score(domain, percentile, grade):
+    grade = _plain(grade)
+    return {"domain": _plain(domain), "percentile": _plain(percentile), "grade": grade,
+            "flagged": grade in FLAG_GRADES}
+
+
+def _npq_score(domain, score, severity, grade):
+    grade = _plain(grade)
+    return {"domain": _plain(domain), "score": _plain(score), "severity": _plain(severity), "grade": grade,
+            "flagged": grade in FLAG_GRADES}
+
+
+def _summary_of(entry, domain_scores, npq):
+    gad7_score, gad7_severity, phq9_score, phq9_severity = questionnaire_scores(entry)
+    subtests = [
+        {"test": test_name, "metric": metric, "part": part, "percentile": percentile, "grade": grade,
+         "flagged": flagged}
+        for test_name, metric, part, percentile, grade, flagged
+        in subtest_results(entry["subtest_percentiles"], entry.get("edits"))
+    ]
+    return {
+        "domain_scores": domain_scores,
+        "npq": npq,
+        "subtests": subtests,
+        "gad7_score": gad7_score,
+        "gad7_severity": gad7_severity,
+        "phq9_score": phq9_score,
+        "phq9_severity": phq9_severity,
+        "notes": list((entry.get("edits") or {}).get("notes") or []),
+    }
+
+
+def report_views(entry):
+    """``(summary, model)`` of an entry from one grading of its tables.
+
+    The summary (``summarize_report``) feeds the JSON, CSV and FHIR exports
+    and the cohort store; the ``ReportModel`` (``build_report_model``, None
+    when there is nothing to render) feeds the DOCX.
+    """
+    upper_df, lower_df = graded_tables(entry)
+    return _summary(entry, upper_df, lower_df), _report_model(entry, upper_df, lower_df)
+
+
+# Rows of the upper and lower table of one entry, as process_upper_table and
+# process_lower_table select them; None when the upper table is not regular
+# enough to take apart without pandas
+def _table_rows(entry):
+    tables = entry["tables"]
+    upper = []
+    if len(tables) >= 2:
+        header, *rows = tables[1]
+        if len(header) < 4 or any(len(row) != len(header) for row in rows):
+            return None
+        upper = [(row[0], row[3]) for row in rows]
+    lower = []
+    if entry["test_data"] is not None:
+        lower_table_data = find_lower_table(tables)
+        if lower_table_data:
+            lower = [row[:3] for row in lower_table_data[1:] if len(row) >= 3]
+    return upper, lower
+
+
+def summarize_reports(entries):
+    """``summarize_report`` of many entries, with all their tables graded in one pass.
+
+    Used for bulk re-grading, where building and grading two small frames per
+    report would cost more than everything else put together.
+    """
+    entries = list(entries)
+    upper_rows = []
+    lower_rows = []
+    single = {}
+    for number, entry in enumerate(entries):
+        rows = _table_rows(entry)
+        if rows is None:
+            single[number] = summarize_report(entry)
+            continue
+        upper_rows.extend((number, *row) for row in rows[0])
+        lower_rows.extend((number, *row) for row in rows[1])
+
+    domain_scores = {number: [] for number in range(len(entries))}
+    upper = grade_domain_scores(pd.DataFrame(upper_rows, columns=["report", "Domain Scores", "Percentile"]))
+    for number, domain, percentile, grade in zip(*(upper[column].tolist() for column in upper.columns)):
+        overrides = section_overrides(entries[number].get("edits"), "Domain Scores")
+        domain_scores[number].append(_domain_score(domain, percentile, overrides.get(domain, grade)))
+
+    npq = {number: [] for number in range(len(entries))}
+    lower = grade_npq_scores(pd.DataFrame(lower_rows, columns=["report", "Domain", "Score", "Severity"]))
+    for number, domain, score, severity, grade in zip(*(lower[column].tolist() for column in lower.columns)):
+        overrides = section_overrides(entries[number].get("edits"), "NPQ")
+        npq[number].append(_npq_score(domain, score, severity, overrides.get(domain, grade)))
+
+    return [single[number] if number in single else _summary_of(entry, domain_scores[number], npq[number])
+            for number, entry in enumerate(entries)]
+
+
+def process_report(pdf, cache=None, render_docx=True):
+    """Run the whole extraction pipeline on one PDF without any UI.
+
+    ``pdf`` may be a path, a binary file object or the raw bytes. Returns a dict
+    with the content ``key``, the ``summary`` from ``summarize_report`` and the
+    ``docx`` bytes (None when there is nothing to render or ``render_docx`` is
+    false).
+    """
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, "rb") as f:
+            pdf_bytes = f.read()
+    elif isinstance(pdf, (bytes, bytearray)):
+        pdf_bytes = bytes(pdf)
+    else:
+        pdf_bytes = pdf.read()
+
+    key, entry = extract_report_data(pdf_bytes, cache)
+    docx_data = None
+    summary, model = report_views(entry)
+    if render_docx and model is not None:
+        docx_data = DEFAULT_TEMPLATE.render(model)
+    return {"key": key, "summary": summary, "docx": docx_data}
+
+
+# Job body for the app's background queue: extract and render one upload, with
+# stage metrics; the entry carries its DOCX bytes, ready for the report cache
+def prepare_report(pdf_bytes, name=None):
+    metrics = PipelineMetrics(name)
+    key, entry = extract_report_data(pdf_bytes, metrics=metrics)
+    with stage(metrics, "render_docx"):
+        docx_bio = render_report_docx(entry)
+    entry["docx"] = docx_bio.getvalue() if docx_bio is not None else None
+    return key, entry, metrics
+
+
+# Render the combined table, subtest results and GAD-7/PHQ-9 lines into a DOCX
+def csv_to_docx_with_flagging(df, test_data, gad7_score, phq9_score):
+    lines, npq_heading_before = score_lines(df)
+    model = ReportModel(lines, npq_heading_before, test_sections_from_strings(test_data), gad7_score, phq9_score)
+    return BytesIO(DEFAULT_TEMPLATE.render(model))
+
+
+# Subtest sections straight from the raw percentiles, with no string round trip;
+# ``edits`` are the clinician's, applied as in derive_entry
+def test_sections(subtest_percentiles, edits=None):
+    sections = []
+    for test_name, metrics in subtest_percentiles.items():
+        test_overrides = section_overrides(edits, test_name)
+        lines = []
+        for metric, raw in metrics.items():
+            if isinstance(raw, list):
+                # Grouped metrics are written out as their list, as they always were
+                value = [{label: apply_flagging(item_raw) for label, item_raw in item.items()} for item in raw]
+                lines.append(ReportLine(f"  {metric}: {value}", False))
+            else:
+                percentile = int(raw)
+                grade, flagged = grade_subtest(percentile, test_overrides.get(metric))
+                lines.append(ReportLine(f"  {metric}: {percentile}, {grade}", flagged))
+        sections.append(TestSection(test_name, lines))
+    return sections
+
+
+# Grade of a subtest percentile and whether it is flagged; ``override`` is a
+# clinician's grade for it (section_overrides)
+def grade_subtest(percentile, override=None):
+    grade = override or grading_system(percentile)
+    return grade, grade in FLAG_GRADES
+
+
+# Typed subtest results with the clinician's grades applied, one
+# (test, metric, part, percentile, grade, flagged) per percentile. ``part`` is
+# the label within a grouped metric and None otherwise; grouped metrics cannot
+# be overridden
+def subtest_results(subtest_percentiles, edits=None):
+    for test_name, metrics in subtest_percentiles.items():
+        overrides = section_overrides(edits, test_name)
+        for metric, raw in metrics.items():
+            if isinstance(raw, list):
+                for item in raw:
+                    for part, item_raw in item.items():
+                        yield (test_name, metric, part, int(item_raw), *grade_subtest(int(item_raw)))
+            else:
+                yield (test_name, metric, None, int(raw), *grade_subtest(int(raw), overrides.get(metric)))
+
+
+# Function to apply flagging to a subtest percentile
+def apply_flagging(percentile):
+    percentile = int(percentile)
+    if percentile > 74:
+        return f"{percentile}, Above Average"
+    elif 25 <= percentile <= 74:
+        return f"{percentile}, Average"
+    elif 9 <= percentile <= 24:
+        return f"{percentile}, Low Average | FLAG"
+    elif 2 <= percentile <= 8:
+        return f"{percentile}, Low | FLAG"
+    else:
+        return f"{percentile}, Very Low | FLAG"
+
+
+# Extract the subtest percentiles (see subtests.SUBTESTS) and flag each one
+def extract_vbm_vsm_finger_tests(report):
+    text = ensure_parsed(report).text
+    return map_values(extract_subtests(text), apply_flagging)
+
+# Function to classify the GAD-7 score based on provided ranges
+def classify_gad7_score(score):
+    score = int(score)
+    if 0 <= score <= 4:
+        return "None-Minimal anxiety"
+    elif 5 <= score <= 9:
+        return "Mild anxiety"
+    elif 10 <= score <= 14:
+        return "Moderate anxiety"
+    elif 15 <= score <= 21:
+        return "Severe anxiety"
+    else:
+        return "Invalid score"
+
+# Function to extract and classify GAD-7 score from a PDF
+def extract_gad7_score(report):
+    return gad7_line(extract_gad7_raw(report))
+
+
+# The GAD-7 total as printed in the PDF, or None
+def extract_gad7_raw(report):
+    full_text = ensure_parsed(report).text
+
+    # Search for the GAD-7 score (GAD7_PATTERN) in the full text
+    gad7_match = GAD7_PATTERN.search(full_text)
+    return gad7_match.group(1) if gad7_match else None
+
+
+# The GAD-7 paragraph of the report for a raw total
+def gad7_line(gad7_raw):
+    if gad7_raw is None:
+        return "GAD-7 score not found in the document."
+    calculated_severity = classify_gad7_score(gad7_raw)
+    # Format the result to match the required output
+    return f"Generalized Anxiety Disorder (GAD-7) Scale:\n• Total Score: {gad7_raw} ({calculated_severity})"
+    
+
+# Extract PHQ-9 score and classify it
+def extract_phq9_score(report):
+    text = ensure_parsed(report).text
+
+    score_match = PHQ9_PATTERN.search(text)
+    
+    if score_match:
+        score = int(score_match.group(1))
+        return score
+    else:
+        return None
+
+# The PHQ-9 severity of a total score; None when it is out of range
+def classify_phq9_score(score):
+    if 1 <= score <= 4:
+        return "Minimal depression"
+    elif 5 <= score <= 9:
+        return "Mild depression"
+    elif 10 <= score <= 14:
+        return "Moderate depression"
+    elif 15 <= score <= 19:
+        return "Moderately severe depression"
+    elif 20 <= score <= 27:
+        return "Severe depression"
+    return None
+
+def interpret_phq9_score(score):
+    if score is None:
+        return "PHQ-9 score not found"
+    severity = classify_phq9_score(score)
+    if severity is None:
+        return "Score out of expected range"
+
+    # Return the output in the desired format
+    return f"Patient Health Questionnaire (PHQ-9):\n• Total Score: {score} ({severity})"
@@ -0,0 +1,86 @@
+"""Bulk re-grading of cached reports: ``cnsvs-regrade CACHE_DIR``.
+
+The report cache (``CNSVS_CACHE_DIR``) keeps each report's raw extracted
+values next to the grades derived from them (see ``pipeline.RAW_FIELDS``).
+After a change to the grading rules (and a bump of ``grading.RULES_VERSION``)
+this re-derives every cached report graded under the old rules from its raw
+values. No PDF is opened, so an archive of thousands of reports takes
+seconds. With ``--store`` the rows of reports already in a cohort store are
+replaced too. DOCX files are dropped and rebuilt when next downloaded, or
+right away with ``--docx``.
+"""
+import argparse
+import sys
+import time
+
+# Cohort rows are rewritten in transactions of this many reports
+STORE_CHUNK = 500
+
+
+def regrade_cache(cache, store=None, render_docx=False, force=False):
+    """Re-derive the cached entries graded under other rules (every one with ``force``).
+
+    Returns ``(regraded, total)``. Reports that are in ``store`` get their
+    rows replaced; others are not added. A clinician's edits are kept.
+    """
+    from pipeline import needs_regrade, regrade_entry, summarize_reports
+
+    regraded = 0
+    total = 0
+    stored = []
+    store_keys = store.keys() if store is not None else set()
+
+    # Summaries are built a chunk at a time, with all their tables graded at once
+    def flush():
+        summaries = summarize_reports(entry for _, entry in stored)
+        store.replace_many((key, summary, None) for (key, _), summary in zip(stored, summaries))
+        stored.clear()
+
+    for key in cache.keys():
+        entry = cache.get(key)
+        if entry is None:
+            continue
+        total += 1
+        if not force and not needs_regrade(entry):
+            continue
+        entry = regrade_entry(entry, render_docx=render_docx)
+        cache.put(key, entry)
+        regraded += 1
+        if key in store_keys:
+            stored.append((key, entry))
+            if len(stored) >= STORE_CHUNK:
+                flush()
+    if stored:
+        flush()
+    return regraded, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cnsvs-regrade",
+        description="Re-grade cached CNSVS reports under the current grading rules without re-parsing the PDFs.",
+    )
+    parser.add_argument("cache_dir", metavar="CACHE_DIR", help="report cache folder (CNSVS_CACHE_DIR)")
+    parser.add_argument("--store", metavar="DB", help="SQLite cohort store whose rows are replaced as well")
+    parser.add_argument("--docx", action="store_true", help="rebuild the DOCX reports now instead of on download")
+    parser.add_argument("--all", action="store_true",
+                        help="re-grade every report, not only those graded under other rules")
+    args = parser.parse_args(argv)
+
+    from report_cache import ReportCache
+
+    # Entries are streamed through; the memory tier only needs to hold one
+    cache = ReportCache(max_entries=1, disk_dir=args.cache_dir, max_disk_entries=sys.maxsize)
+    store = None
+    if args.store:
+        from cohort_store import CohortStore
+        store = CohortStore(args.store)
+
+    start = time.perf_counter()
+    regraded, total = regrade_cache(cache, store, render_docx=args.docx, force=args.all)
+    print(f"{regraded} of {total} cached report(s) re-graded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
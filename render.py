@@ -0,0 +1,232 @@
+"""DOCX rendering of extracted reports from a typed model.
+
+``csv_to_docx_with_flagging`` used to walk ``df.iterrows()``, look up the
+'ListBullet' style by id for every paragraph, and split " | FLAG" back out of
+preformatted strings. Here a report is first reduced to a ``ReportModel`` of
+lines with a precomputed ``flagged`` bit; the table part is built with
+column-wise pandas operations. The model is then written straight into the
+document XML with style ids resolved once per template.
+
+A ``DocxTemplate`` parses its .docx package once and gives each thread its
+own deep copy of the parsed document (cloning is several times faster than
+parsing). The body is reset for every render, so repeated renders do not
+re-read python-docx's default template. Several models can go into one
+document, one report per page. python-docx itself is imported on first use.
+"""
+import copy
+import threading
+from collections import namedtuple
+from io import BytesIO
+
+import pandas as pd
+
+TITLE = "CNSVS Metrics with Percentiles, Scores, and Grades"
+NPQ_HEADING = "NeuroPsych Questionnaire (NPQ) SF-45"
+NOTES_HEADING = "Clinician Notes"
+
+# Grades that get a bold " | FLAG" after the line
+FLAG_GRADES = ["Low Average", "Low", "Very Low", "FLAG"]
+
+# A bullet line; flagged lines end in a bold "FLAG"
+ReportLine = namedtuple("ReportLine", ["text", "flagged"])
+
+# A subtest heading and its bullet lines
+TestSection = namedtuple("TestSection", ["name", "lines"])
+
+# Everything one report renders: score lines (with the NPQ heading position),
+# subtest sections, the GAD-7/PHQ-9 paragraphs and any clinician notes
+ReportModel = namedtuple("ReportModel", ["score_lines", "npq_heading_before", "tests", "gad7", "phq9", "notes"],
+                         defaults=((),))
+
+
+def score_lines(df):
+    """Bullet lines for the combined domain/NPQ table, built column-wise.
+
+    Returns ``(lines, npq_heading_before)``, where the second value is the index
+    of the line the NPQ heading goes in front of (the first NPQ "Attention"
+    row), or None.
+    """
+    if df.empty:
+        return [], None
+
+    no_rows = pd.Series(False, index=df.index)
+    is_upper = df["Domain Scores"].notna() if "Domain Scores" in df.columns else no_rows
+    is_lower = ~is_upper & df["Domain"].notna() if "Domain" in df.columns else no_rows
+
+    texts = pd.Series(None, index=df.index, dtype=object)
+    if is_upper.any():
+        upper = df[is_upper]
+        texts[is_upper] = (upper["Domain Scores"].astype(str) + ": " + upper["Percentile"].astype(str)
+                           + ", " + upper["Grade"].astype(str))
+    if is_lower.any():
+        lower = df[is_lower]
+        texts[is_lower] = (lower["Domain"].astype(str) + ": " + lower["Score"].astype(str)
+                           + ", " + lower["Severity"].astype(str))
+    # A row with neither label repeats the line before it, as the row loop did
+    texts = texts.ffill()
+
+    if "Grade" in df.columns:
+        flags = df["Grade"].isin(FLAG_GRADES)
+    else:
+        flags = no_rows
+
+    keep = texts.notna()
+    attention = (is_lower & (df["Domain"] == "Attention"))[keep] if "Domain" in df.columns else no_rows[keep]
+    npq_heading_before = None
+    if attention.any():
+        npq_heading_before = int(attention.to_numpy().argmax())
+
+    lines = [ReportLine(text, bool(flag)) for text, flag in zip(texts[keep].tolist(), flags[keep].tolist())]
+    return lines, npq_heading_before
+
+
+# Subtest sections from the flagged strings of extract_vbm_vsm_finger_tests
+def test_sections_from_strings(test_data):
+    sections = []
+    for test_name, metrics in (test_data or {}).items():
+        lines = []
+        for metric, value in metrics.items():
+            if "FLAG" in value:
+                value_part, _ = value.split(" | ")
+                lines.append(ReportLine(f"  {metric}: {value_part}", True))
+            else:
+                lines.append(ReportLine(f"  {metric}: {value}", False))
+        sections.append(TestSection(test_name, lines))
+    return sections
+
+
+class DocxTemplate:
+    """A .docx package parsed once and cloned for each thread that renders.
+
+    ``path`` may name a custom template (e.g. clinic letterhead). Its body
+    content is kept and the report is appended after it. The default is
+    python-docx's built-in template.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._master = None
+        self._local = threading.local()
+
+    # The parsed package, its original body content and the style ids;
+    # never rendered into, only cloned
+    def _load(self):
+        with self._lock:
+            if self._master is None:
+                from docx import Document
+
+                document = Document(self.path)
+                body = document.element.body
+                original = [copy.deepcopy(child) for child in body if child is not body.sectPr]
+                styles = {
+                    "ListBullet": document.styles["List Bullet"].style_id,
+                }
+                self._master = (document, original, styles)
+            return self._master
+
+    def clone(self):
+        """A fresh python-docx Document copied from the parsed template."""
+        document, _, _ = self._load()
+        return copy.deepcopy(document)
+
+    def warm(self):
+        """Parse the template now, and clone it for the calling thread."""
+        self._document()
+
+    def _document(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            _, original, styles = self._load()
+            state = self._local.state = (self.clone(), original, styles)
+        return state
+
+    def render(self, models):
+        """DOCX bytes for one ``ReportModel`` or a list of them, one per page."""
+        if isinstance(models, ReportModel):
+            models = [models]
+        document, original, styles = self._document()
+        body = document.element.body
+        for child in list(body):
+            if child is not body.sectPr:
+                body.remove(child)
+        for child in original:
+            clone = copy.deepcopy(child)
+            if body.sectPr is None:
+                body.append(clone)
+            else:
+                body.sectPr.addprevious(clone)
+
+        for i, model in enumerate(models):
+            if i:
+                body._add_p().add_r().add_br().type = "page"
+            _write_report(body, model, styles)
+
+        bio = BytesIO()
+        document.save(bio)
+        return bio.getvalue()
+
+
+def _add_text(body, text, bold=False, style=None):
+    p = body._add_p()
+    if style is not None:
+        p.style = style
+    r = p.add_r()
+    r.text = text
+    if bold:
+        r.get_or_add_rPr().get_or_add_b()
+    return p
+
+
+# Bold, black heading run of the given size
+def _add_heading(body, text, size):
+    from docx.shared import Pt, RGBColor
+
+    p = body._add_p()
+    r = p.add_r()
+    r.text = text
+    rPr = r.get_or_add_rPr()
+    rPr.get_or_add_b()
+    rPr.sz_val = Pt(size)
+    rPr.get_or_add_color().val = RGBColor(0, 0, 0)
+    return p
+
+
+def _add_line(body, line, style):
+    p = body._add_p()
+    p.style = style
+    if line.flagged:
+        p.add_r().text = line.text + " | "
+        flag = p.add_r()
+        flag.text = "FLAG"
+        flag.get_or_add_rPr().get_or_add_b()
+    else:
+        p.add_r().text = line.text
+
+
+def _write_report(body, model, styles):
+    bullet = styles["ListBullet"]
+    _add_heading(body, TITLE, 16)
+
+    for i, line in enumerate(model.score_lines):
+        if i == model.npq_heading_before:
+            _add_heading(body, NPQ_HEADING, 14)
+        _add_line(body, line, bullet)
+
+    for section in model.tests:
+        _add_text(body, f" {section.name}", bold=True)
+        for line in section.lines:
+            _add_line(body, line, bullet)
+
+    if model.gad7:
+        _add_text(body, model.gad7, bold=True)
+    if model.phq9:
+        _add_text(body, model.phq9, bold=True)
+
+    if model.notes:
+        _add_heading(body, NOTES_HEADING, 14)
+        for note in model.notes:
+            _add_text(body, note)
+
+
+DEFAULT_TEMPLATE = DocxTemplate()
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# Bump whenever the shape or meaning of cached entries changes so stale
+# on-disk entries from an older version are ignored instead of reused.
+CACHE_VERSION = "4"
+
+
+# SHA-256 of the uploaded bytes, used as the cache key
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReportCache:
+    """Bounded LRU cache of processed reports with an optional on-disk tier.
+
+    Entries are plain dicts (the raw extracted values, the grades derived
+    from them, DOCX bytes; see ``pipeline.RAW_FIELDS``) keyed by ``content_key`` of the uploaded PDF. The in-memory tier
+    holds at most ``max_entries`` reports; when ``disk_dir`` is set, entries
+    are also pickled there so they survive server restarts, and the directory
+    is trimmed to ``max_disk_entries`` files, oldest first. Entries with
+    stage errors (partial results, see guard.py) are kept in memory only, so
+    a transient timeout is not saved for good.
+
+    Clinician edits (``pipeline.derive_entry``) are kept apart from the
+    entries by ``set_edits``: they are never evicted, and with ``disk_dir``
+    they are written to their own JSON files, which trimming leaves alone.
+    A report that drops out of the cache and is processed again can then be
+    re-graded with them (``edits``).
+    """
+
+    def __init__(self, max_entries=32, disk_dir=None, max_disk_entries=1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._edits = {}
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    # Merge new fields (e.g. DOCX bytes built later in the run) into an entry
+    def update(self, key, **fields):
+        entry = dict(self.get(key) or {})
+        entry.update(fields)
+        self.put(key, entry)
+        return entry
+
+    # Drop an entry from both tiers, e.g. to process its PDF again
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    # The clinician edits saved for a report, or None
+    def edits(self, key):
+        with self._lock:
+            if key in self._edits:
+                return self._edits[key]
+        edits = self._read_edits(key)
+        if edits is not None:
+            with self._lock:
+                self._edits.setdefault(key, edits)
+        return edits
+
+    def set_edits(self, key, edits):
+        with self._lock:
+            self._edits[key] = edits
+        if self.disk_dir:
+            path = self._edits_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(edits, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+    def keys(self):
+        """Keys of every cached entry, in memory or (for this CACHE_VERSION) on disk."""
+        with self._lock:
+            keys = list(self._entries)
+        if self.disk_dir:
+            prefix = f"v{CACHE_VERSION}-"
+            try:
+                names = os.listdir(self.disk_dir)
+            except OSError:
+                names = []
+            seen = set(keys)
+            for name in sorted(names):
+                if name.startswith(prefix) and name.endswith(".pkl"):
+                    key = name[len(prefix):-len(".pkl")]
+                    if key not in seen:
+                        keys.append(key)
+                        seen.add(key)
+        return keys
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"v{CACHE_VERSION}-{key}.pkl")
+
+    def _edits_path(self, key):
+        return os.path.join(self.disk_dir, f"edits-{key}.json")
+
+    def _read_edits(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._edits_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        # Touch the file so disk eviction is least-recently-used as well
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir or entry.get("errors"):
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Rewriting an entry (a re-grade, DOCX added later) cannot overfill the directory
+        replacing = os.path.exists(path)
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        if not replacing:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        try:
+            names = [name for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        except OSError:
+            return
+        if len(names) <= self.max_disk_entries:
+            return
+        paths = [os.path.join(self.disk_dir, name) for name in names]
+        paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,194 @@
+"""Report-by-report processing of PDFs that hold many patients' reports.
+
+``parse_pdf`` keeps every page of a file until it is done, and pdfplumber's
+``pdf.pages`` holds a Page object, with all of its parsed layout, for every
+page. A multi-patient export of thousands of pages therefore costs memory in
+proportion to its size. Here the pages are created one at a time and closed
+(which drops pdfplumber's caches) as soon as their text and tables are read.
+Each report is handed on as soon as its last page is done, so memory stays at
+about one report's worth of data however many reports the file holds.
+
+Report boundaries come from the page index (``PageIndex.report_ranges``).
+Without one (no pypdfium2, or a file it cannot read), every page is laid out
+and a page whose text holds a ``REPORT_MARKERS`` header starts a new report.
+
+``process_reports`` runs every stage inline. The app and ``cnsvs-extract``
+instead take the boundaries from ``report_ranges`` and cut each report out
+into a PDF of its own (``report_pdf``), so its stages can run under the time
+budgets of guard.py like any single report.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import partial
+from io import BytesIO
+
+import pdfplumber
+from pdfminer.pdfpage import PDFPage
+from pdfplumber.page import Page
+
+from instrumentation import stage
+from page_index import PDFIUM_LOCK, REPORT_MARKERS, build_page_index
+from pipeline import ParsedReport, extract_entry, parse_page, report_views
+from render import DEFAULT_TEMPLATE
+from report_cache import content_key
+
+
+def iter_pages(pdf):
+    """Pages of an open pdfplumber PDF, created lazily and closed after use.
+
+    Unlike ``pdf.pages`` nothing is kept, so a finished page's parsed layout can
+    be freed straight away.
+    """
+    doctop = 0
+    for page_number, page_obj in enumerate(PDFPage.create_pages(pdf.doc), start=1):
+        page = Page(pdf, page_obj, page_number=page_number, initial_doctop=doctop)
+        doctop += page.height
+        try:
+            yield page
+        finally:
+            page.close()
+
+
+def _starts_report(text):
+    text = re.sub(r"\s+", " ", text or "")
+    return any(marker in text for marker in REPORT_MARKERS)
+
+
+def iter_reports(pdf_file, metrics=None):
+    """Yield ``(first_page, ParsedReport)`` for each report in ``pdf_file``.
+
+    ``pdf_file`` is a path or a binary file object. A path is read from disk
+    as pages are needed, so the file is never held in memory whole. Page
+    numbers are 0-based. Within a report, pages are picked the same way as in
+    ``parse_pdf``.
+    """
+    with stage(metrics, "page_index"):
+        page_index = build_page_index(pdf_file)
+    if page_index is not None:
+        starts = {first for first, _ in page_index.report_ranges()}
+        text_pages = page_index.text_pages
+        table_pages = page_index.table_pages
+
+    first_page = 0
+    page_texts = []
+    page_tables = []
+    table_count = 0
+    with pdfplumber.open(pdf_file) as pdf:
+        for page_number, page in enumerate(iter_pages(pdf)):
+            if page_index is None:
+                text, tables = parse_page(page, metrics=metrics)
+                starts_report = _starts_report(text)
+            else:
+                starts_report = page_number in starts
+
+            if starts_report and page_texts:
+                yield first_page, ParsedReport(page_texts, page_tables, page_index)
+                first_page = page_number
+                page_texts = []
+                page_tables = []
+                table_count = 0
+
+            if page_index is not None:
+                text, tables = parse_page(
+                    page,
+                    text=page_number in text_pages,
+                    tables=table_count < 2 or page_number in table_pages,
+                    metrics=metrics,
+                )
+            table_count += len(tables)
+            page_texts.append(text)
+            page_tables.append(tables)
+
+    if page_texts:
+        yield first_page, ParsedReport(page_texts, page_tables, page_index)
+
+
+def report_ranges(pdf_file):
+    """``(first, end)`` page ranges of the reports in ``pdf_file``, as ``iter_reports`` splits it."""
+    page_index = build_page_index(pdf_file)
+    if page_index is not None:
+        return page_index.report_ranges()
+    starts = [0]
+    page_count = 0
+    with pdfplumber.open(pdf_file) as pdf:
+        for page_number, page in enumerate(iter_pages(pdf)):
+            if page_number and _starts_report(page.extract_text()):
+                starts.append(page_number)
+            page_count += 1
+    return list(zip(starts, starts[1:] + [page_count]))
+
+
+def report_pdf(pdf_file, first, end):
+    """Bytes of a PDF holding pages ``first`` to ``end - 1`` of ``pdf_file``.
+
+    Needs pypdfium2, which pdfplumber installs with itself.
+    """
+    import pypdfium2
+
+    buffer = BytesIO()
+    try:
+        with PDFIUM_LOCK:
+            source = pypdfium2.PdfDocument(pdf_file)
+            try:
+                report = pypdfium2.PdfDocument.new()
+                try:
+                    report.import_pages(source, list(range(first, end)))
+                    report.save(buffer)
+                finally:
+                    report.close()
+            finally:
+                source.close()
+    finally:
+        if hasattr(pdf_file, "seek"):
+            pdf_file.seek(0)
+    return buffer.getvalue()
+
+
+# Key of one report in a multi-report file: it has no file bytes of its own,
+# so the source file's key and the report's 0-based first and last page
+def report_key(source_key, first, last):
+    return content_key(json.dumps([source_key, first, last]).encode("utf-8"))
+
+
+# content_key of a path or binary file object, read a chunk at a time
+def file_key(pdf_file):
+    digest = hashlib.sha256()
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, "rb") as f:
+            for chunk in iter(partial(f.read, 1 << 20), b""):
+                digest.update(chunk)
+    else:
+        position = pdf_file.tell()
+        pdf_file.seek(0)
+        for chunk in iter(partial(pdf_file.read, 1 << 20), b""):
+            digest.update(chunk)
+        pdf_file.seek(position)
+    return digest.hexdigest()
+
+
+def process_reports(pdf_file, render_docx=True, metrics=None):
+    """Run the whole pipeline on every report in a multi-report PDF, one at a time.
+
+    Yields one dict per report as soon as its pages are done: ``pages`` (the
+    0-based first and last page), ``key`` (``report_key``), ``summary`` and
+    ``docx`` as from ``pipeline.process_report``. Reports with identical
+    values (such as two without any data) still get different keys.
+    """
+    with stage(metrics, "cache_lookup"):
+        source_key = file_key(pdf_file)
+    for first_page, report in iter_reports(pdf_file, metrics):
+        entry = extract_entry(report, metrics)
+        summary, model = report_views(entry)
+        docx_data = None
+        if render_docx and model is not None:
+            with stage(metrics, "render_docx"):
+                docx_data = DEFAULT_TEMPLATE.render(model)
+        pages = (first_page, first_page + len(report.page_texts) - 1)
+        yield {
+            "pages": pages,
+            "key": report_key(source_key, *pages),
+            "summary": summary,
+            "docx": docx_data,
+        }
@@ -0,0 +1,173 @@
+"""Declarative extraction of the CNSVS subtest percentiles.
+
+Every subtest is described by its section header and the metric labels it
+reports, in document order. A ``(group, labels)`` entry is a named sub-block
+of metrics (POET's "Positive Emotions", FPCPT's "Part 1", ...). Each metric
+line reads ``<label> <score> <standard score> <percentile>`` and the percentile
+is captured.
+
+The table is compiled once at import. ``extract_subtests`` finds every section
+header in one scan of the text, then matches each section's metrics inside
+that section's slice only. That keeps the work linear in document length.
+Adding a subtest is a new ``SUBTESTS`` entry, not a new regex.
+"""
+import re
+
+SUBTESTS = [
+    ("Verbal Memory Test (VBM)", [
+        "Correct Hits - Immediate",
+        "Correct Passes - Immediate",
+        "Correct Hits - Delay",
+        "Correct Passes - Delay",
+    ]),
+    ("Visual Memory Test (VSM)", [
+        "Correct Hits - Immediate",
+        "Correct Passes - Immediate",
+        "Correct Hits - Delay",
+        "Correct Passes - Delay",
+    ]),
+    ("Finger Tapping Test (FTT)", [
+        "Right Taps Average",
+        "Left Taps Average",
+    ]),
+    ("Symbol Digit Coding (SDC)", [
+        "Correct Responses",
+        "Errors*",
+    ]),
+    ("Stroop Test (ST)", [
+        "Simple Reaction Time*",
+        "Complex Reaction Time Correct*",
+        "Stroop Reaction Time Correct*",
+        "Stroop Commission Errors*",
+    ]),
+    ("Shifting Attention Test (SAT)", [
+        "Correct Responses",
+        "Errors*",
+        "Correct Reaction Time*",
+    ]),
+    ("Continuous Performance Test (CPT)", [
+        "Correct Responses",
+        "Omission Errors*",
+        "Commission Errors*",
+        "Choice Reaction Time Correct*",
+    ]),
+    ("Perception Of Emotions Test (POET)", [
+        "Correct Responses",
+        "Average Correct Reaction Time*",
+        "Omission Errors*",
+        "Commission Errors*",
+        ("Positive Emotions", ["Correct Hits", "Reaction Time*"]),
+        ("Negative Emotions", ["Correct Hits", "Reaction Time*"]),
+    ]),
+    ("Reasoning Test (RT)", [
+        "Correct Responses",
+        "Average Correct Reaction Time*",
+        "Commission Errors*",
+        "Omission Errors*",
+    ]),
+    ("Four Part Continuous Performance Test (FPCPT)", [
+        ("Part 1", ["Average Correct Reaction Time*"]),
+        ("Part 2", ["Correct Responses", "Average Correct Reaction Time*", "Incorrect Responses*",
+                    "Average Incorrect Reaction Time*", "Omission Errors*"]),
+        ("Part 3", ["Correct Responses", "Average Correct Reaction Time*", "Incorrect Responses*",
+                    "Average Incorrect Reaction Time*", "Omission Errors*"]),
+        ("Part 4", ["Correct Responses", "Average Correct Reaction Time*", "Incorrect Responses*",
+                    "Average Incorrect Reaction Time*", "Omission Errors*"]),
+    ]),
+]
+
+SUBTEST_NAMES = [name for name, _ in SUBTESTS]
+
+
+def _metric_pattern(label):
+    return re.compile(re.escape(label) + r" \d+ \d+ (\d+)")
+
+
+# Compile the table into (header, [step, ...]) where a step is either
+# ("metric", label, pattern) or ("group", name, pattern, [metric steps])
+def _compile(subtests):
+    compiled = []
+    for name, metrics in subtests:
+        steps = []
+        for metric in metrics:
+            if isinstance(metric, tuple):
+                group, labels = metric
+                steps.append(("group", group, re.compile(re.escape(group)),
+                              [("metric", label, _metric_pattern(label)) for label in labels]))
+            else:
+                steps.append(("metric", metric, _metric_pattern(metric)))
+        compiled.append((name, steps))
+    return compiled
+
+
+_COMPILED_SUBTESTS = _compile(SUBTESTS)
+_SECTION_PATTERN = re.compile("|".join(re.escape(name) for name in SUBTEST_NAMES))
+
+
+# Section name -> [(start, end), ...] for each occurrence of its header, where
+# a section runs until the next header of any subtest
+def find_sections(text):
+    headers = [(match.start(), match.group(0)) for match in _SECTION_PATTERN.finditer(text)]
+    sections = {}
+    for i, (start, name) in enumerate(headers):
+        end = headers[i + 1][0] if i + 1 < len(headers) else len(text)
+        sections.setdefault(name, []).append((start, end))
+    return sections
+
+
+# Match the steps in order within text[pos:end]; None unless every step matches
+def _match_steps(steps, text, pos, end):
+    values = {}
+    for step in steps:
+        if step[0] == "metric":
+            match = step[2].search(text, pos, end)
+            if match is None:
+                return None, pos
+            values[step[1]] = match.group(1)
+            pos = match.end()
+        else:
+            marker = step[2].search(text, pos, end)
+            if marker is None:
+                return None, pos
+            group_values, pos = _match_steps(step[3], text, marker.end(), end)
+            if group_values is None:
+                return None, pos
+            values[step[1]] = [{label: value} for label, value in group_values.items()]
+    return values, pos
+
+
+def extract_subtests(text):
+    """Raw percentile strings for every subtest in ``text``.
+
+    Returns ``{subtest: {metric: percentile}}`` in ``SUBTESTS`` order. Grouped
+    metrics come back as ``{group: [{metric: percentile}, ...]}``. A subtest
+    whose metrics are not all present is left as an empty dict.
+    """
+    sections = find_sections(text)
+    results = {}
+    for name, steps in _COMPILED_SUBTESTS:
+        values = None
+        occurrences = sections.get(name, [])
+        for start, end in occurrences:
+            values, _ = _match_steps(steps, text, start, end)
+            if values is not None:
+                break
+        # Headers laid out apart from their data (e.g. side by side) still
+        # resolve by reading on from the first header, as the old regexes did
+        if values is None and occurrences:
+            values, _ = _match_steps(steps, text, occurrences[0][0], len(text))
+        results[name] = values or {}
+    return results
+
+
+# Apply fn to every raw value, keeping the nesting of extract_subtests
+def map_values(subtest_values, fn):
+    mapped = {}
+    for name, metrics in subtest_values.items():
+        mapped[name] = {}
+        for metric, value in metrics.items():
+            if isinstance(value, list):
+                mapped[name][metric] = [{label: fn(raw) for label, raw in item.items()} for item in value]
+            else:
+                mapped[name][metric] = fn(value)
+    return mapped
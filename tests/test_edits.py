@@ -0,0 +1,42 @@
+"""Clinician edits reach every view of a report the same way."""
+from pipeline import build_report_model, derive_entry
+from report_cache import ReportCache
+
+VBM = "Verbal Memory Test (VBM)"
+
+RAW = {
+    "tables": [],
+    "subtest_percentiles": {VBM: {"Correct Hits - Immediate": "35", "Correct Passes - Immediate": "12"}},
+    "gad7_raw": None,
+    "phq9_score": None,
+}
+
+
+def docx_lines(entry):
+    (section,) = build_report_model(entry).tests
+    return [line.text.strip() for line in section.lines]
+
+
+def test_docx_takes_valid_subtest_overrides():
+    entry = derive_entry(RAW, {"grades": {VBM: {"Correct Hits - Immediate": "Low"}}})
+    assert entry["test_data"][VBM]["Correct Hits - Immediate"] == "35, Low | FLAG"
+    assert docx_lines(entry)[0] == "Correct Hits - Immediate: 35, Low"
+
+
+def test_docx_ignores_grades_not_offered_for_the_section():
+    entry = derive_entry(RAW, {"grades": {VBM: {"Correct Hits - Immediate": "FLAG"}}})
+    assert entry["test_data"][VBM]["Correct Hits - Immediate"] == "35, Average"
+    assert docx_lines(entry)[0] == "Correct Hits - Immediate: 35, Average"
+
+
+def test_edits_outlive_the_cached_entry(tmp_path):
+    edits = {"grades": {"NPQ": {"Memory": None}}, "notes": ["Retest in May"]}
+    cache = ReportCache(max_entries=1, disk_dir=str(tmp_path))
+    cache.put("a", derive_entry(RAW, edits))
+    cache.set_edits("a", edits)
+    cache.put("b", derive_entry(RAW))
+    cache.discard("a")
+    assert "a" not in cache
+    assert cache.edits("a") == edits
+    assert ReportCache(disk_dir=str(tmp_path)).edits("a") == edits
+    assert ReportCache(disk_dir=str(tmp_path)).edits("b") is None
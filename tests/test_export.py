@@ -0,0 +1,67 @@
+"""JSON, CSV, FHIR and the cohort rows all come from the typed summary."""
+import csv
+import io
+import json
+
+from cohort_store import summary_rows as cohort_rows
+from export import export_entry
+from pipeline import derive_entry, summarize_report
+
+VBM = "Verbal Memory Test (VBM)"
+POET = "Perception Of Emotions Test (POET)"
+
+RAW = {
+    "tables": [],
+    "subtest_percentiles": {
+        VBM: {"Correct Hits - Immediate": "35", "Correct Passes - Immediate": "12"},
+        POET: {"Positive Emotions": [{"Correct Hits": "5"}, {"Reaction Time*": "80"}]},
+    },
+    "gad7_raw": "23",
+    "phq9_score": 12,
+}
+
+EDITS = {"grades": {VBM: {"Correct Hits - Immediate": "Low"}}, "notes": ["Retest"]}
+
+
+def test_summary_is_typed():
+    summary = summarize_report(derive_entry(RAW, EDITS))
+    assert summary["subtests"] == [
+        {"test": VBM, "metric": "Correct Hits - Immediate", "part": None, "percentile": 35, "grade": "Low",
+         "flagged": True},
+        {"test": VBM, "metric": "Correct Passes - Immediate", "part": None, "percentile": 12,
+         "grade": "Low Average", "flagged": True},
+        {"test": POET, "metric": "Positive Emotions", "part": "Correct Hits", "percentile": 5, "grade": "Low",
+         "flagged": True},
+        {"test": POET, "metric": "Positive Emotions", "part": "Reaction Time*", "percentile": 80,
+         "grade": "Above Average", "flagged": False},
+    ]
+    assert (summary["gad7_score"], summary["gad7_severity"]) == (23, "Invalid score")
+    assert (summary["phq9_score"], summary["phq9_severity"]) == (12, "Moderate depression")
+
+
+def test_formats_share_the_typed_values():
+    entry = derive_entry(RAW, EDITS)
+    exports = export_entry(entry, "a.pdf", "k", ["json", "csv", "fhir"])
+    assert json.loads(exports["json"])["subtests"][0]["percentile"] == 35
+
+    rows = list(csv.reader(io.StringIO(exports["csv"].decode("utf-8"))))
+    assert rows[1] == ["a.pdf", VBM, "Correct Hits - Immediate", "35", "Low", "True"]
+    assert rows[3] == ["a.pdf", POET, "Positive Emotions - Correct Hits", "5", "Low", "True"]
+    assert rows[5:] == [
+        ["a.pdf", "GAD-7", "Total Score", "23", "Invalid score", ""],
+        ["a.pdf", "PHQ-9", "Total Score", "12", "Moderate depression", "True"],
+        ["a.pdf", "Notes", "", "Retest", "", ""],
+    ]
+
+    observations = {entry["resource"]["code"]["text"]: entry["resource"]
+                    for entry in json.loads(exports["fhir"])["entry"][1:]}
+    first = observations[f"{VBM} Correct Hits - Immediate"]
+    assert first["valueQuantity"]["value"] == 35
+    assert first["interpretation"][0]["coding"][0]["code"] == "A"
+    # An out-of-range severity stays text only
+    assert observations["GAD-7 total score"]["interpretation"] == [{"text": "Invalid score"}]
+
+    summary = summarize_report(entry)
+    stored = cohort_rows("k", summary, "a.pdf")
+    assert stored["reports"][0][3:] == (23, "Invalid score", 12, "Moderate depression")
+    assert stored["subtest_metrics"][0] == ("k", VBM, "Correct Hits - Immediate", None, 35, "Low", 1)
@@ -0,0 +1,67 @@
+"""The vectorized grading against ``Series.apply`` of the scalar functions.
+
+The expected frames are built the way ``process_upper_table`` and
+``process_lower_table`` built them before ``grading`` existed. Columns are
+random mixes of the cells CNSVS tables hold, including cells without digits,
+so both the int64 and the float64 results are covered.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+from grading import grade_domain_scores, grade_npq_scores
+from pipeline import clean_percentile, clean_score, grading_system, grading_system_2
+
+CELLS = ["0", "1", "2", "8", "9", "24", "25", "74", "75", "99", "100", "<1", ">99",
+         "45%", "7th", " 12 ", "3 (low)", "NA", "-", "", None]
+SEVERITIES = ["Mild", "Moderate", "Severe", "None", "Minimal", "mild", "", None]
+
+
+def old_domain_scores(df):
+    graded = df.copy()
+    graded["Percentile"] = graded["Percentile"].apply(clean_percentile)
+    graded = graded.dropna(subset=["Percentile"])
+    graded["Grade"] = graded["Percentile"].apply(grading_system)
+    return graded
+
+
+def old_npq_scores(df):
+    graded = df.copy()
+    graded["Score"] = graded["Score"].apply(clean_score)
+    graded = graded.dropna(subset=["Score"])
+    graded["Grade"] = graded["Severity"].apply(grading_system_2)
+    return graded
+
+
+# About a third of the columns have a number in every cell; the rest mix in
+# cells without digits
+def cells(rnd, rows):
+    digits_only = rnd.random() < 0.3
+    pool = [cell for cell in CELLS if cell and cell[0].isdigit()] if digits_only else CELLS
+    return [rnd.choice(pool) for _ in range(rows)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_domain_scores_match_apply(seed):
+    rnd = random.Random(seed)
+    for _ in range(200):
+        rows = rnd.randint(1, 12)
+        df = pd.DataFrame({
+            "Domain Scores": [f"Domain {n}" for n in range(rows)],
+            "Percentile": cells(rnd, rows),
+        })
+        pd.testing.assert_frame_equal(grade_domain_scores(df), old_domain_scores(df))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_npq_scores_match_apply(seed):
+    rnd = random.Random(seed)
+    for _ in range(200):
+        rows = rnd.randint(1, 12)
+        df = pd.DataFrame({
+            "Domain": [f"Domain {n}" for n in range(rows)],
+            "Score": cells(rnd, rows),
+            "Severity": [rnd.choice(SEVERITIES) for _ in range(rows)],
+        })
+        pd.testing.assert_frame_equal(grade_npq_scores(df), old_npq_scores(df))
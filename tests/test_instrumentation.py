@@ -0,0 +1,34 @@
+"""Stage memory is the growth within the stage, not the process high-water mark."""
+import tracemalloc
+
+from instrumentation import PipelineMetrics, start_tracing
+
+
+def test_stage_reports_its_own_growth(monkeypatch):
+    monkeypatch.setenv("CNSVS_TRACE_MEMORY", "1")
+    was_tracing = tracemalloc.is_tracing()
+    start_tracing()
+    try:
+        metrics = PipelineMetrics()
+        with metrics.stage("big"):
+            block = bytearray(8 * 1024 * 1024)
+            del block
+        with metrics.stage("small"):
+            pass
+        assert metrics.stages["big"]["py_growth_mb"] >= 8
+        assert metrics.stages["small"]["py_growth_mb"] < 1
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def test_tracing_is_opt_in(monkeypatch):
+    monkeypatch.delenv("CNSVS_TRACE_MEMORY", raising=False)
+    if tracemalloc.is_tracing():
+        return
+    start_tracing()
+    assert not tracemalloc.is_tracing()
+    metrics = PipelineMetrics()
+    with metrics.stage("untraced"):
+        pass
+    assert metrics.stages["untraced"]["py_growth_mb"] is None
@@ -0,0 +1,28 @@
+"""JobQueue bookkeeping, on a thread pool."""
+import threading
+import time
+
+from jobs import DONE, JobQueue
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_pop_drops_a_collected_job():
+    queue = JobQueue(max_workers=1, processes=False)
+    release = threading.Event()
+    job = queue.submit("a", "slow", release.wait)
+    assert queue.pop(job.id) is None
+    assert queue.get(job.id) is job
+
+    release.set()
+    wait_until(lambda: job.finished)
+    assert job.status == DONE
+    assert queue.pop(job.id) is job
+    assert queue.get(job.id) is None
+    assert queue.pop(job.id) is None
+    queue.shutdown()
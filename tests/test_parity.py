@@ -0,0 +1,31 @@
+"""Every text engine against pdfplumber on the synthetic reports (benchmarks.parity)."""
+from io import BytesIO
+
+import pytest
+
+from benchmarks.parity import REFERENCE, SYNTHETIC, check
+from benchmarks.synthetic import make_report
+from page_index import build_page_index
+from text_engines import ENGINES, PdfiumText
+
+ENGINE_NAMES = sorted(set(ENGINES) - {REFERENCE})
+
+
+@pytest.mark.parametrize("engine", ENGINE_NAMES)
+@pytest.mark.parametrize("name", sorted(SYNTHETIC))
+def test_engine_matches_reference(engine, name):
+    if engine == "pdfium" and not PdfiumText.available():
+        pytest.skip("pypdfium2 is not installed")
+    mismatches, _ = check(name, make_report(0, **SYNTHETIC[name]), [engine])
+    assert mismatches == {}
+
+
+def test_pdfium_takes_text_from_the_index():
+    if not PdfiumText.available():
+        pytest.skip("pypdfium2 is not installed")
+    data = make_report(0)
+    page_index = build_page_index(BytesIO(data), keep_texts=True)
+    pages = page_index.text_pages
+    assert page_index.page_texts.keys() == pages
+    # Given the index, the engine never opens the file
+    assert PdfiumText().page_texts(None, pages, page_index) == PdfiumText().page_texts(BytesIO(data), pages)
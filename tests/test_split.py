@@ -0,0 +1,15 @@
+"""Guarded splitting of a multi-patient PDF against ``streaming.process_reports``."""
+from batch import iter_split_results
+from benchmarks.synthetic import make_reports
+from streaming import process_reports
+
+
+def test_split_reports_match_streaming(tmp_path):
+    pdf_path = tmp_path / "export.pdf"
+    pdf_path.write_bytes(make_reports(3))
+    expected = list(process_reports(str(pdf_path), render_docx=False))
+    results = list(iter_split_results("export.pdf", str(pdf_path), render_docx=False))
+    assert [result.name for result in results] == ["export_1.pdf", "export_2.pdf", "export_3.pdf"]
+    assert [result.error for result in results] == [None] * 3
+    assert [(result.key, result.data) for result in results] == [
+        (report["key"], report["summary"]) for report in expected]
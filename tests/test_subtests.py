@@ -0,0 +1,97 @@
+"""extract_subtests against the per-subtest regexes it replaced.
+
+The patterns below are the ones ``extract_vbm_vsm_finger_tests`` used before
+the declarative engine, kept here as the reference. Texts are generated with
+sections shuffled, metrics and whole sections dropped and noise lines mixed
+in. FPCPT is only compared on complete sections: its old pattern backtracks
+for minutes once a metric is missing, which is why it was replaced.
+"""
+import random
+import re
+
+import pytest
+
+from pipeline import apply_flagging, map_values
+from subtests import SUBTESTS, extract_subtests
+
+OLD_PATTERNS = {
+    "Verbal Memory Test (VBM)": r"Verbal Memory Test \(VBM\).*?Correct Hits - Immediate \d+ \d+ (\d+).*?Correct Passes - Immediate \d+ \d+ (\d+).*?Correct Hits - Delay \d+ \d+ (\d+).*?Correct Passes - Delay \d+ \d+ (\d+)",
+    "Visual Memory Test (VSM)": r"Visual Memory Test \(VSM\).*?Correct Hits - Immediate \d+ \d+ (\d+).*?Correct Passes - Immediate \d+ \d+ (\d+).*?Correct Hits - Delay \d+ \d+ (\d+).*?Correct Passes - Delay \d+ \d+ (\d+)",
+    "Finger Tapping Test (FTT)": r"Finger Tapping Test \(FTT\).*?Right Taps Average \d+ \d+ (\d+).*?Left Taps Average \d+ \d+ (\d+)",
+    "Symbol Digit Coding (SDC)": r"Symbol Digit Coding \(SDC\).*?Correct Responses \d+ \d+ (\d+).*?Errors\* \d+ \d+ (\d+)",
+    "Stroop Test (ST)": r"Stroop Test \(ST\).*?Simple Reaction Time\* \d+ \d+ (\d+).*?Complex Reaction Time Correct\* \d+ \d+ (\d+).*?Stroop Reaction Time Correct\* \d+ \d+ (\d+).*?Stroop Commission Errors\* \d+ \d+ (\d+)",
+    "Shifting Attention Test (SAT)": r"Shifting Attention Test \(SAT\).*?Correct Responses \d+ \d+ (\d+).*?Errors\* \d+ \d+ (\d+).*?Correct Reaction Time\* \d+ \d+ (\d+)",
+    "Continuous Performance Test (CPT)": r"Continuous Performance Test \(CPT\).*?Correct Responses \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Choice Reaction Time Correct\* \d+ \d+ (\d+)",
+    "Perception Of Emotions Test (POET)": r"Perception Of Emotions Test \(POET\).*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Positive Emotions.*?Correct Hits \d+ \d+ (\d+).*?Reaction Time\* \d+ \d+ (\d+).*?Negative Emotions.*?Correct Hits \d+ \d+ (\d+).*?Reaction Time\* \d+ \d+ (\d+)",
+    "Reasoning Test (RT)": r"Reasoning Test \(RT\).*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?Commission Errors\* \d+ \d+ (\d+).*?Omission Errors\* \d+ \d+ (\d+)",
+    "Four Part Continuous Performance Test (FPCPT)": (
+        r"Four Part Continuous Performance Test \(FPCPT\).*?"
+        r"Part 1.*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Part 2.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Omission Errors\* \d+ \d+ (\d+).*?"
+        r"Part 3.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Omission Errors\* \d+ \d+ (\d+).*?"
+        r"Part 4.*?Correct Responses \d+ \d+ (\d+).*?Average Correct Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Incorrect Responses\* \d+ \d+ (\d+).*?Average Incorrect Reaction Time\* \d+ \d+ (\d+).*?"
+        r"Omission Errors\* \d+ \d+ (\d+)"
+    ),
+}
+
+
+# The old extraction, shaped like extract_subtests: the captured percentiles
+# in SUBTESTS order, grouped metrics as lists of one-item dicts
+def old_extract(text):
+    result = {}
+    for name, metrics in SUBTESTS:
+        match = re.search(OLD_PATTERNS[name], text, re.DOTALL)
+        result[name] = {}
+        if match is None:
+            continue
+        values = iter(match.groups())
+        for metric in metrics:
+            if isinstance(metric, tuple):
+                group, labels = metric
+                result[name][group] = [{label: next(values)} for label in labels]
+            else:
+                result[name][metric] = next(values)
+    return result
+
+
+FPCPT = "Four Part Continuous Performance Test (FPCPT)"
+
+
+# complete=True keeps every section and metric, FPCPT included
+def generate(rnd, complete=False):
+    lines = []
+    for name, metrics in rnd.sample(SUBTESTS, len(SUBTESTS)):
+        if not complete and (name == FPCPT or rnd.random() < 0.2):
+            continue
+        lines.append(name)
+        for metric in metrics:
+            group, labels = metric if isinstance(metric, tuple) else (None, [metric])
+            if group is not None:
+                lines.append(group)
+            for label in labels:
+                if not complete and rnd.random() < 0.05:
+                    continue
+                lines.append(f"{label} {rnd.randint(1, 99)} {rnd.randint(60, 130)} {rnd.randint(1, 99)}")
+        if rnd.random() < 0.3:
+            lines.append("noise line 1 2 3")
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_old_regexes(seed):
+    rnd = random.Random(seed)
+    for _ in range(200):
+        text = generate(rnd)
+        assert extract_subtests(text) == old_extract(text), text
+
+
+def test_complete_report_is_fully_extracted():
+    text = generate(random.Random(0), complete=True)
+    extracted = extract_subtests(text)
+    assert all(extracted[name] for name, _ in SUBTESTS)
+    assert map_values(extracted, apply_flagging) == map_values(old_extract(text), apply_flagging)
@@ -0,0 +1,84 @@
+"""Pluggable plain-text engines for the regex extraction stage.
+
+The subtest, GAD-7 and PHQ-9 extractors only read plain text lines. pdfplumber
+builds that text from a full character-level layout, which is the slowest
+thing the pipeline does. pypdfium2 (already a pdfplumber dependency) returns
+a page's text from native code in well under a millisecond. Only the domain
+and NPQ tables need pdfplumber's layout, for ``extract_tables``.
+
+An engine has a ``name`` and ``page_texts(pdf_file, pages, page_index=None)``,
+which returns ``{page_number: text}``. The pdfium engine takes the text from a
+``page_index`` built with ``keep_texts`` instead of reading the file again.
+``get_text_engine`` resolves a name from
+``ENGINES``. "auto" (the default, or ``CNSVS_TEXT_ENGINE``) picks pdfium when
+it is installed. ``python -m benchmarks.parity`` checks that the engines give
+the same extracted values on a set of reports.
+"""
+import os
+import re
+
+from page_index import pdfium_texts
+
+
+# Line text of a raw pdfium_texts page, as pdfplumber lays it out
+def _normalize(text):
+    # pdfium ends lines with \r\n and keeps runs of spaces that pdfplumber's
+    # word grouping collapses
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r" *\n *", "\n", text).strip(" ")
+
+
+class PdfplumberText:
+    """Text from pdfplumber's layout analysis; the reference engine."""
+
+    name = "pdfplumber"
+
+    def page_texts(self, pdf_file, pages=None, page_index=None):
+        import pdfplumber
+
+        texts = {}
+        with pdfplumber.open(pdf_file) as pdf:
+            for page_number, page in enumerate(pdf.pages):
+                if pages is None or page_number in pages:
+                    texts[page_number] = page.extract_text() or ""
+                    page.close()
+        return texts
+
+
+class PdfiumText:
+    """Text straight from PDFium's text layer, without any layout analysis."""
+
+    name = "pdfium"
+
+    def page_texts(self, pdf_file, pages=None, page_index=None):
+        kept = page_index.page_texts if page_index is not None else None
+        if kept is not None and pages is not None and set(pages) <= kept.keys():
+            raw_texts = ((page_number, kept[page_number]) for page_number in sorted(pages))
+        else:
+            raw_texts = pdfium_texts(pdf_file, pages)
+        return {page_number: _normalize(text) for page_number, text in raw_texts}
+
+    @staticmethod
+    def available():
+        try:
+            import pypdfium2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+
+ENGINES = {
+    "pdfplumber": PdfplumberText,
+    "pdfium": PdfiumText,
+}
+
+
+def get_text_engine(name=None):
+    """Engine instance for ``name``, ``CNSVS_TEXT_ENGINE`` or "auto"."""
+    name = name or os.environ.get("CNSVS_TEXT_ENGINE") or "auto"
+    if name == "auto":
+        name = "pdfium" if PdfiumText.available() else "pdfplumber"
+    if name not in ENGINES:
+        raise ValueError(f"unknown text engine {name!r}; choose from {', '.join(sorted(ENGINES))} or auto")
+    return ENGINES[name]()
@@ -0,0 +1,79 @@
+"""Warm start for the server and its worker processes.
+
+A fresh process pays for more than its first report: the pandas/numpy,
+pdfplumber and python-docx imports, parsing the DOCX template, and the work
+pdfminer and pdfplumber put off until they first see a page. ``warm_up`` does
+all of that in advance by running a one-page sample PDF through
+``prepare_report``. The app calls it once at server boot, and every guarded
+stage worker (see guard.py) runs it before it takes its first stage. A cold
+worker is then warm before it sees a report, and the first upload after a
+restart is as fast as later ones.
+
+``python -m benchmarks.startup`` measures import, warm-up and first-report
+times in fresh processes.
+"""
+import importlib
+import threading
+
+from instrumentation import PipelineMetrics, stage
+
+# Imported by warm_up; pypdfium2 and docx are otherwise loaded on first use
+HEAVY_MODULES = ["numpy", "pandas", "pdfplumber", "pypdfium2", "docx"]
+
+_lock = threading.Lock()
+_warmed = None
+
+
+# One page holding the questionnaire lines and a small ruled table, built by
+# hand like benchmarks.synthetic so that no PDF library is needed
+def _sample_pdf():
+    content = (b"BT /F1 9 Tf 40 740 Td (GAD-7 Anxiety Severity 0) Tj 0 -12 Td (PHQ-9 Score 0) Tj ET\n"
+               b"40 700 m 240 700 l S 40 686 m 240 686 l S 40 672 m 240 672 l S\n"
+               b"40 700 m 40 672 l S 140 700 m 140 672 l S 240 700 m 240 672 l S\n"
+               b"BT /F1 8 Tf 42 690 Td (Domain) Tj 100 0 Td (Score) Tj ET")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def warm_up():
+    """Import, parse and exercise everything the first report would; once per process.
+
+    Returns the stage timings of the warm-up (``PipelineMetrics.to_dict``).
+    Later calls return the same timings without doing anything.
+    """
+    global _warmed
+    with _lock:
+        if _warmed is None:
+            from pipeline import prepare_report
+            from render import DEFAULT_TEMPLATE
+
+            metrics = PipelineMetrics("warm_up")
+            with stage(metrics, "import"):
+                for module in HEAVY_MODULES:
+                    try:
+                        importlib.import_module(module)
+                    except ImportError:
+                        pass
+            with stage(metrics, "docx_template"):
+                DEFAULT_TEMPLATE.warm()
+            with stage(metrics, "sample_report"):
+                prepare_report(_sample_pdf(), "warm-up")
+            _warmed = metrics.to_dict()
+        return _warmed